@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import threading
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# 🗃️ Historial de noticias publicadas: fichero JSONL de solo-añadir con índice en memoria.
+# Cada línea es {"titulo", "url", "fecha"}; si una URL aparece varias veces manda la última.
+
+# Parámetros de seguimiento que no cambian el contenido de la página
+PARAMETROS_SEGUIMIENTO = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "ref_src"}
+
+
+def canonizar_url(url: str) -> str:
+    """
+    Normaliza una URL para que variantes de la misma noticia compartan clave:
+    esquema y host en minúsculas, sin www, sin fragmento, sin parámetros de seguimiento,
+    con la query ordenada y sin barra final.
+    """
+    partes = urlsplit(url.strip())
+    esquema = partes.scheme.lower() or "https"
+    if esquema == "http":
+        esquema = "https"
+    host = (partes.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if partes.port and partes.port not in (80, 443):
+        host = f"{host}:{partes.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in PARAMETROS_SEGUIMIENTO
+    )
+    ruta = partes.path.rstrip("/")
+    return urlunsplit((esquema, host, ruta, urlencode(query), ""))
+
+
+@contextmanager
+def _bloqueo_exclusivo(ruta: Path):
+    """
+    Bloqueo entre procesos sobre un fichero auxiliar (fcntl en Linux, msvcrt en Windows).
+    """
+    with open(ruta, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class AlmacenNoticias:
+    """
+    Historial sin límite de noticias publicadas. Las consultas van contra un diccionario en memoria
+    (O(1)) y cada publicación añade una sola línea al fichero (O(1)). Las líneas escritas por otros
+    procesos se incorporan leyendo solo lo añadido desde la última lectura.
+    """
+
+    def __init__(self, ruta: str, importar_de: Optional[str] = None, umbral_compactacion: int = 500):
+        self.ruta = Path(ruta)
+        self.ruta_bloqueo = self.ruta.with_name(self.ruta.name + ".lock")
+        self.umbral_compactacion = umbral_compactacion
+        self._indice: Dict[str, dict] = {}
+        self._lineas = 0
+        self._posicion = 0
+        self._inodo = None
+        # Protege el índice cuando el pipeline consulta y publica desde hilos distintos
+        self._lock = threading.RLock()
+
+        if importar_de and not self.ruta.exists() and Path(importar_de).exists():
+            self._importar_json(Path(importar_de))
+        self._recargar()
+
+    def _importar_json(self, origen: Path):
+        with _bloqueo_exclusivo(self.ruta_bloqueo):
+            if self.ruta.exists():
+                return
+            try:
+                with open(origen, "r", encoding="utf-8") as f:
+                    noticias = json.load(f)
+            except json.JSONDecodeError:
+                noticias = []
+            self._escribir_completo([n for n in noticias if n.get("url")])
+        print(f"📥 Importadas {len(noticias)} noticias desde {origen}")
+
+    def _escribir_completo(self, noticias):
+        temporal = self.ruta.with_name(self.ruta.name + ".tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            for noticia in noticias:
+                f.write(json.dumps(noticia, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta)
+
+    def _recargar(self):
+        self._indice = {}
+        self._lineas = 0
+        self._posicion = 0
+        self._inodo = None
+        self._leer_nuevas()
+
+    def _leer_nuevas(self):
+        """
+        Incorpora al índice las líneas añadidas desde la última lectura. Si el fichero ha sido
+        compactado por otro proceso (cambia el inodo o encoge), se relee entero.
+        """
+        try:
+            estado = self.ruta.stat()
+        except FileNotFoundError:
+            return
+        if self._inodo is not None and (estado.st_ino != self._inodo or estado.st_size < self._posicion):
+            self._recargar()
+            return
+        self._inodo = estado.st_ino
+        if estado.st_size == self._posicion:
+            return
+
+        with open(self.ruta, "rb") as f:
+            f.seek(self._posicion)
+            datos = f.read()
+        # Solo procesamos líneas completas; una escritura a medias se leerá en la próxima pasada
+        fin = datos.rfind(b"\n") + 1
+        for linea in datos[:fin].splitlines():
+            if not linea.strip():
+                continue
+            try:
+                noticia = json.loads(linea.decode("utf-8"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            self._indice[canonizar_url(noticia["url"])] = noticia
+            self._lineas += 1
+        self._posicion += fin
+
+    def contiene(self, url: str) -> bool:
+        with self._lock:
+            self._leer_nuevas()
+            return canonizar_url(url) in self._indice
+
+    def guardar(self, titulo: str, url: str, fecha: Optional[str] = None):
+        noticia = {
+            "titulo": titulo,
+            "url": url,
+            "fecha": fecha or datetime.now().strftime("%Y-%m-%d")
+        }
+        linea = json.dumps(noticia, ensure_ascii=False) + "\n"
+
+        with self._lock, _bloqueo_exclusivo(self.ruta_bloqueo):
+            self._leer_nuevas()
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(linea)
+                f.flush()
+                os.fsync(f.fileno())
+            self._leer_nuevas()
+            if self._lineas - len(self._indice) >= self.umbral_compactacion:
+                self._compactar()
+
+    def compactar(self):
+        with self._lock, _bloqueo_exclusivo(self.ruta_bloqueo):
+            self._leer_nuevas()
+            self._compactar()
+
+    def _compactar(self):
+        """
+        Reescribe el fichero con una línea por URL. Debe llamarse con el bloqueo tomado.
+        """
+        self._escribir_completo(self._indice.values())
+        print(f"🧹 Historial compactado: {self._lineas} líneas → {len(self._indice)} noticias")
+        self._recargar()
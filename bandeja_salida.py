@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from almacen_noticias import canonizar_url
+from metricas import METRICAS
+
+# 📮 Bandeja de salida duradera: la generación deja aquí cada publicación terminada (texto + imagen)
+# y un enviador la vacía hacia Telegram. Si el envío falla, la publicación sigue en disco y se
+# reintenta; solo se marca como publicada cuando Telegram confirma el envío.
+DIRECTORIO_BANDEJA = os.getenv("BANDEJA_SALIDA", "bandeja_salida")
+# Telegram permite unos 20 mensajes por minuto en un mismo grupo o canal
+MENSAJES_POR_MINUTO = float(os.getenv("TELEGRAM_MENSAJES_POR_MINUTO", "20"))
+# Los errores de red no descartan nunca la publicación (generarla es lo caro): a partir de estos
+# intentos solo se avisa en cada reintento
+MAX_INTENTOS = int(os.getenv("BANDEJA_MAX_INTENTOS", "8"))
+# Backoff entre ejecuciones: de minutos a horas, no segundos dentro de la misma ejecución
+ESPERA_BASE = float(os.getenv("BANDEJA_ESPERA_BASE_MIN", "2")) * 60
+ESPERA_MAXIMA = float(os.getenv("BANDEJA_ESPERA_MAXIMA_H", "6")) * 3600
+# Lo más que se espera dentro de una ejecución: pausas cortas de RetryAfter y el reintento sin Markdown
+ESPERA_EN_EJECUCION = 30.0
+
+
+class BandejaSalida:
+    """
+    Cada publicación son dos ficheros: <id>.img con la imagen y <id>.json con los metadatos.
+    Se escribe primero la imagen y después el JSON (con os.replace), así que un JSON presente
+    siempre tiene su imagen completa. El id empieza por la hora con nanosegundos: ordenar por
+    nombre es ordenar por llegada.
+    """
+
+    def __init__(self, directorio: str = DIRECTORIO_BANDEJA):
+        self.directorio = Path(directorio)
+        self.directorio_fallidas = self.directorio / "fallidas"
+        self.directorio_fallidas.mkdir(parents=True, exist_ok=True)
+        self._ultimo_ns = 0
+        # URL canónica de cada publicación pendiente (id → URL); se relee solo lo que cambia
+        self._urls: Dict[str, str] = {}
+        self._version_directorio = None
+        self._lock = threading.Lock()
+
+    def _escribir(self, ruta: Path, datos: bytes):
+        temporal = ruta.with_name(ruta.name + ".tmp")
+        with open(temporal, "wb") as f:
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+
+    def _guardar_meta(self, meta: dict):
+        self._escribir(self.directorio / f"{meta['id']}.json",
+                       json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def _nuevo_id(self) -> str:
+        with self._lock:
+            # Estrictamente creciente en este proceso aunque dos lleguen en el mismo instante
+            self._ultimo_ns = max(time.time_ns(), self._ultimo_ns + 1)
+            segundos, nanosegundos = divmod(self._ultimo_ns, 10 ** 9)
+        return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(segundos))}-{nanosegundos:09d}-{uuid.uuid4().hex[:8]}"
+
+    def encolar(self, titulo: str, url: str, caption: str, imagen: bytes) -> str:
+        id_publicacion = self._nuevo_id()
+        self._escribir(self.directorio / f"{id_publicacion}.img", imagen)
+        self._guardar_meta({
+            "id": id_publicacion,
+            "titulo": titulo,
+            "url": url,
+            "caption": caption,
+            "parse_mode": "Markdown",
+            "intentos": 0,
+            "proximo_intento": 0.0,
+            "ultimo_error": None,
+        })
+        with self._lock:
+            self._urls[id_publicacion] = canonizar_url(url)
+        print(f"📮 Publicación guardada en la bandeja de salida: {id_publicacion}")
+        return id_publicacion
+
+    def pendientes(self) -> List[dict]:
+        metas = []
+        for ruta in sorted(self.directorio.glob("*.json")):
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    metas.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                continue
+        return metas
+
+    def _refrescar_urls(self):
+        # La fecha del directorio cambia al crear o borrar ficheros (también desde otro proceso,
+        # como el enviador aparte): solo entonces se listan y se leen los JSON nuevos
+        version = self.directorio.stat().st_mtime_ns
+        if version == self._version_directorio:
+            return
+        ids = {ruta.stem for ruta in self.directorio.glob("*.json")}
+        for id_publicacion in set(self._urls) - ids:
+            del self._urls[id_publicacion]
+        for id_publicacion in ids - set(self._urls):
+            try:
+                with open(self.directorio / f"{id_publicacion}.json", "r", encoding="utf-8") as f:
+                    self._urls[id_publicacion] = canonizar_url(json.load(f)["url"])
+            except (OSError, json.JSONDecodeError, KeyError):
+                continue
+        self._version_directorio = version
+
+    def contiene_url(self, url: str) -> bool:
+        clave = canonizar_url(url)
+        with self._lock:
+            self._refrescar_urls()
+            return clave in self._urls.values()
+
+    def leer_imagen(self, meta: dict) -> bytes:
+        return (self.directorio / f"{meta['id']}.img").read_bytes()
+
+    def reprogramar(self, meta: dict, error: str, espera: float, contar_intento: bool = True):
+        if contar_intento:
+            meta["intentos"] += 1
+        meta["proximo_intento"] = time.time() + espera
+        meta["ultimo_error"] = error
+        self._guardar_meta(meta)
+
+    def marcar_publicada(self, meta: dict):
+        (self.directorio / f"{meta['id']}.json").unlink(missing_ok=True)
+        (self.directorio / f"{meta['id']}.img").unlink(missing_ok=True)
+        with self._lock:
+            self._urls.pop(meta["id"], None)
+
+    def marcar_fallida(self, meta: dict):
+        for extension in ("img", "json"):
+            origen = self.directorio / f"{meta['id']}.{extension}"
+            if origen.exists():
+                os.replace(origen, self.directorio_fallidas / origen.name)
+        with self._lock:
+            self._urls.pop(meta["id"], None)
+
+
+class CuboTokens:
+    """
+    Limitador token-bucket: `tasa` tokens por segundo, hasta `capacidad` acumulados.
+    """
+
+    def __init__(self, tasa: float, capacidad: float = 1.0):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.ultimo = time.monotonic()
+
+    async def adquirir(self):
+        while True:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+            self.ultimo = ahora
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.tasa)
+
+
+def espera_con_jitter(intento: int) -> float:
+    """
+    Backoff exponencial con jitter: entre la mitad y el total de base·2^intento (con tope), así
+    ningún reintento por error de red vence dentro de la misma ejecución.
+    """
+    tope = min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** intento)
+    return random.uniform(tope / 2, tope)
+
+
+class EnviadorTelegram:
+    """
+    Vacía la bandeja respetando el ritmo de Telegram. `al_publicar(titulo, url)` se llama solo
+    después de que Telegram confirme el envío (p. ej. para guardar la noticia en el historial).
+    """
+
+    def __init__(self, bot, chat_id: str, bandeja: BandejaSalida,
+                 al_publicar: Optional[Callable[[str, str], None]] = None,
+                 mensajes_por_minuto: float = MENSAJES_POR_MINUTO):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.bandeja = bandeja
+        self.al_publicar = al_publicar
+        self.cubo = CuboTokens(mensajes_por_minuto / 60.0)
+        # Hasta cuándo (time.time) no se envía nada porque Telegram respondió RetryAfter
+        self.pausa_hasta = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _enviar(self, meta: dict) -> bool:
+        # El paquete telegram tarda en importarse: solo se carga si hay algo que enviar
+        from telegram.error import BadRequest, RetryAfter, TelegramError
+        await self.cubo.adquirir()
+        try:
+            await self.bot.send_photo(
+                chat_id=self.chat_id,
+                photo=self.bandeja.leer_imagen(meta),
+                caption=meta["caption"],
+                parse_mode=meta["parse_mode"]
+            )
+        except RetryAfter as e:
+            # Control de flood: Telegram nos dice cuánto esperar; no cuenta como intento fallido
+            espera = float(e.retry_after)
+            METRICAS.incrementar("noticiasbot_envios_fallidos_total", motivo="flood")
+            print(f"⏳ Telegram pide esperar {espera:.0f} s antes de volver a enviar")
+            self.pausa_hasta = time.time() + espera
+            self.bandeja.reprogramar(meta, str(e), espera, contar_intento=False)
+            return False
+        except BadRequest as e:
+            METRICAS.incrementar("noticiasbot_envios_fallidos_total", motivo="peticion")
+            if meta["parse_mode"] and "parse" in str(e).lower():
+                # El Markdown generado por el LLM no es válido: reintentamos como texto plano
+                print(f"⚠️ Markdown no válido ({e}); se reintenta sin formato")
+                meta["parse_mode"] = None
+                self.bandeja.reprogramar(meta, str(e), 0, contar_intento=False)
+            else:
+                print(f"❌ Telegram rechazó la publicación: {e}")
+                self.bandeja.marcar_fallida(meta)
+            return False
+        except TelegramError as e:
+            METRICAS.incrementar("noticiasbot_envios_fallidos_total", motivo="red")
+            espera = espera_con_jitter(meta["intentos"])
+            if meta["intentos"] + 1 >= MAX_INTENTOS:
+                print(f"⚠️ La publicación {meta['id']} sigue sin enviarse tras {meta['intentos'] + 1} intentos: {e}")
+            print(f"🔁 Error enviando a Telegram ({e}); reintento en {espera / 60:.0f} min")
+            self.bandeja.reprogramar(meta, str(e), espera)
+            return False
+
+        if self.al_publicar is not None:
+            self.al_publicar(meta["titulo"], meta["url"])
+        self.bandeja.marcar_publicada(meta)
+        METRICAS.incrementar("noticiasbot_publicaciones_total")
+        print(f"✅ Publicada en Telegram: {meta['titulo']}")
+        return True
+
+    async def drenar(self, esperar_reintentos: bool = True, max_espera: float = ESPERA_EN_EJECUCION) -> int:
+        """
+        Envía todo lo pendiente, en orden de llegada. Con esperar_reintentos, espera a los
+        reintentos programados (y a la pausa que pida Telegram) que venzan en menos de max_espera
+        segundos; los demás quedan para la próxima pasada. Devuelve cuántas publicaciones se enviaron.
+        """
+        enviadas = 0
+        async with self._lock:
+            while True:
+                ahora = time.time()
+                if self.pausa_hasta > ahora:
+                    if not esperar_reintentos or self.pausa_hasta - ahora > max_espera:
+                        return enviadas
+                    await asyncio.sleep(self.pausa_hasta - ahora)
+                    continue
+                pendientes = [m for m in self.bandeja.pendientes() if m["proximo_intento"] - ahora <= max_espera]
+                if not pendientes:
+                    return enviadas
+                listas = [m for m in pendientes if m["proximo_intento"] <= ahora]
+                if not listas:
+                    if not esperar_reintentos:
+                        return enviadas
+                    await asyncio.sleep(min(m["proximo_intento"] for m in pendientes) - ahora)
+                    continue
+                for meta in listas:
+                    if await self._enviar(meta):
+                        enviadas += 1
+                    elif self.pausa_hasta > time.time():
+                        # RetryAfter vale para todo el chat: no se envía nada más hasta que pase
+                        break
+
+    async def ejecutar(self, intervalo: float = 15.0):
+        """
+        Bucle del enviador como proceso aparte: revisa la bandeja cada `intervalo` segundos.
+        """
+        print(f"📮 Enviador activo sobre {self.bandeja.directorio} (Ctrl+C para apagar)")
+        while True:
+            await self.drenar(esperar_reintentos=False)
+            await asyncio.sleep(intervalo)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from telegram import Bot
+    from almacen_noticias import AlmacenNoticias
+
+    load_dotenv(dotenv_path=Path(__file__).resolve().parent / "credenciales_telegram.env")
+    token = os.getenv("TELEGRAM_TOKEN")
+    chat_id = os.getenv("TELEGRAM_CHAT_ID")
+    if not token or not chat_id:
+        raise ValueError("Faltan TELEGRAM_TOKEN o TELEGRAM_CHAT_ID en el .env")
+
+    almacen = AlmacenNoticias("noticias_publicadas.jsonl", importar_de="noticias_publicadas.json")
+    enviador = EnviadorTelegram(Bot(token=token), chat_id, BandejaSalida(), al_publicar=almacen.guardar)
+    if os.name == "nt":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    try:
+        asyncio.run(enviador.ejecutar())
+    except KeyboardInterrupt:
+        print("🛑 Apagando enviador...")
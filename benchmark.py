@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import metricas
+from metricas import pico_rss_mb
+
+# 🧪 Benchmark sin conexión: levanta servidores simulados de Ollama, de la Bot API de Telegram y de
+# Custom Search (y dos feeds RSS con ETag), usa un SDXL diminuto con pesos aleatorios y mide enviar_noticia y el `responder`
+# del bot de chat. El resultado es un JSON comparable entre commits.
+DIRECTORIO_REPO = Path(__file__).resolve().parent
+
+ESCENARIOS = {
+    "rapido": {
+        "latencia_llm": 0.05, "tokens_por_segundo": 200, "paralelo_llm": 4,
+        "latencia_telegram": 0.01, "latencia_busqueda": 0.02,
+        "noticias": 5, "mensajes_chat": 20, "usuarios_chat": 4, "lado_imagen": 64,
+    },
+    "realista": {
+        "latencia_llm": 0.3, "tokens_por_segundo": 30, "paralelo_llm": 1,
+        "latencia_telegram": 0.15, "latencia_busqueda": 0.3,
+        "noticias": 3, "mensajes_chat": 10, "usuarios_chat": 4, "lado_imagen": 128,
+    },
+    "saturado": {
+        "latencia_llm": 0.3, "tokens_por_segundo": 30, "paralelo_llm": 1,
+        "latencia_telegram": 0.15, "latencia_busqueda": 0.3,
+        "noticias": 2, "mensajes_chat": 40, "usuarios_chat": 10, "lado_imagen": 64,
+    },
+}
+
+CAMPOS_ESTRUCTURADOS = {
+    "titulo": "Un nuevo agente de IA aprende de sus errores",
+    "resumen": "El sistema corrige sus propias acciones sin intervención humana.",
+    "comentario": "Si se confirma en producción, reducirá el coste de supervisar estos sistemas.",
+}
+RESPUESTA_LLM = (
+    "TÍTULO: Un nuevo agente de IA aprende de sus errores\n"
+    "RESUMEN: El sistema corrige sus propias acciones sin intervención humana. "
+    "Los investigadores lo consideran un paso hacia agentes más autónomos.\n"
+    "COMENTARIO: Si se confirma en producción, reducirá el coste de supervisar estos sistemas."
+)
+CONCEPTOS = ["robot arm in a laboratory", "glowing neural network", "city skyline at night", "data center corridor"]
+# Cada búsqueda combina piezas al azar (con semilla): noticias distintas entre sí, para que ni la
+# deduplicación por URL ni la de casi-duplicados las descarte
+EMPRESAS = ["OpenAI", "Google DeepMind", "NVIDIA", "Microsoft", "Anthropic", "Meta", "Mistral", "Apple"]
+ANUNCIOS = [
+    "presents an agent that learns from its mistakes", "shows a multimodal model for robotics",
+    "unveils a chip for data centers", "brings assistants to small businesses",
+    "publishes research on interpretability", "releases open weights for speech recognition",
+    "expands cloud training capacity in Europe", "launches a coding model for enterprises",
+]
+DETALLES = [
+    "benchmark", "latency", "researchers", "customers", "hospitals", "regulators", "pricing", "startup",
+    "partnership", "dataset", "safety", "translation", "energy", "investors", "developers", "privacy",
+    "universities", "smartphones", "factories", "accuracy", "scientists", "banks", "schools", "satellites",
+]
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def _resumen_latencias(valores: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(valores),
+        "media": round(sum(valores) / len(valores), 4) if valores else 0.0,
+        "p50": round(_percentil(valores, 0.50), 4),
+        "p95": round(_percentil(valores, 0.95), 4),
+        "max": round(max(valores, default=0.0), 4),
+    }
+
+
+class ServidoresSimulados:
+    """
+    Un ThreadingHTTPServer en 127.0.0.1 con tres prefijos: /ollama (API nativa y compatible con
+    OpenAI), /telegram/bot<token>/<método> y /customsearch/v1. Las latencias salen del escenario.
+    """
+
+    def __init__(self, escenario: dict, semilla: int = 0):
+        self.escenario = escenario
+        self.aleatorio = random.Random(semilla)
+        self.huecos_llm = threading.BoundedSemaphore(escenario["paralelo_llm"])
+        self.peticiones: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._busquedas = 0
+        self._mensajes = 0
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._manejador())
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+
+    def arrancar(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def parar(self):
+        self.servidor.shutdown()
+
+    def _contar(self, clave: str) -> int:
+        with self._lock:
+            self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+            return self.peticiones[clave]
+
+    def _respuesta_llm(self, payload: dict) -> str:
+        formato = payload.get("format")
+        if isinstance(formato, dict):
+            campos = {campo: list(CONCEPTOS) if propiedad.get("type") == "array" else CAMPOS_ESTRUCTURADOS.get(campo, "")
+                      for campo, propiedad in formato.get("properties", {}).items()}
+            return json.dumps(campos, ensure_ascii=False)
+        prompt = payload["messages"][-1]["content"]
+        if "comma-separated" in prompt:
+            return ", ".join(CONCEPTOS)
+        return RESPUESTA_LLM
+
+    def ollama(self, ruta: str, payload: dict) -> dict:
+        if ruta == "/api/generate":
+            return {"model": payload.get("model"), "response": "", "done": True}
+        contenido = self._respuesta_llm(payload)
+        tokens = len(contenido.split())
+        with self.huecos_llm:
+            inicio = time.perf_counter()
+            time.sleep(self.escenario["latencia_llm"] + tokens / self.escenario["tokens_por_segundo"])
+            duracion_ns = int((time.perf_counter() - inicio) * 1e9)
+        if ruta == "/v1/chat/completions":
+            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": contenido}}],
+                    "usage": {"completion_tokens": tokens}}
+        return {"message": {"role": "assistant", "content": contenido}, "done": True,
+                "total_duration": duracion_ns, "eval_count": tokens}
+
+    def telegram(self, metodo: str) -> dict:
+        time.sleep(self.escenario["latencia_telegram"])
+        if metodo == "getMe":
+            return {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}}
+        if metodo in ("sendPhoto", "sendMessage"):
+            with self._lock:
+                self._mensajes += 1
+                id_mensaje = self._mensajes
+            return {"ok": True, "result": {"message_id": id_mensaje, "date": int(time.time()),
+                                           "chat": {"id": 1, "type": "private"}, "text": ""}}
+        return {"ok": True, "result": True}
+
+    def busqueda(self) -> dict:
+        time.sleep(self.escenario["latencia_busqueda"])
+        with self._lock:
+            self._busquedas += 1
+            n = self._busquedas
+            elementos = []
+            for i in range(5):
+                titulo = f"{self.aleatorio.choice(EMPRESAS)} {self.aleatorio.choice(ANUNCIOS)}"
+                snippet = " ".join(self.aleatorio.sample(DETALLES, 6))
+                elementos.append({"title": titulo, "snippet": f"{titulo}: {snippet}.",
+                                  "link": f"https://bench.local/noticias/{n}-{i}"})
+        return {"items": elementos}
+
+    def feed(self, numero: int, etag_cliente: str) -> Tuple[int, bytes, str]:
+        """
+        Un feed RSS fijo por número: si el cliente ya tiene su ETag, 304 sin cuerpo.
+        """
+        time.sleep(self.escenario["latencia_busqueda"])
+        etag = f'"feed-{numero}-v1"'
+        if etag_cliente == etag:
+            return 304, b"", etag
+        items = "".join(
+            f"<item><title>{EMPRESAS[(numero + i) % len(EMPRESAS)]} {ANUNCIOS[(numero * 3 + i) % len(ANUNCIOS)]}</title>"
+            f"<link>https://bench.local/feed-{numero}/{i}</link>"
+            f"<description>&lt;p&gt;{' '.join(DETALLES[(numero * 5 + i + j) % len(DETALLES)] for j in range(0, 18, 3))}&lt;/p&gt;</description>"
+            f"<pubDate>Mon, 0{i + 1} Sep 2025 10:00:00 GMT</pubDate></item>"
+            for i in range(4)
+        )
+        return 200, f'<?xml version="1.0"?><rss version="2.0"><channel>{items}</channel></rss>'.encode("utf-8"), etag
+
+    def _manejador(self):
+        simulados = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _responder(self, datos: dict, estado: int = 200):
+                cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+                self.send_response(estado)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def _atender(self):
+                longitud = int(self.headers.get("Content-Length") or 0)
+                cuerpo = self.rfile.read(longitud) if longitud else b""
+                ruta = self.path.split("?")[0]
+                if ruta.startswith("/ollama/"):
+                    ruta = ruta[len("/ollama"):]
+                    simulados._contar(f"ollama {ruta}")
+                    self._responder(simulados.ollama(ruta, json.loads(cuerpo or b"{}")))
+                elif ruta.startswith("/telegram/"):
+                    metodo = ruta.rsplit("/", 1)[-1]
+                    simulados._contar(f"telegram {metodo}")
+                    self._responder(simulados.telegram(metodo))
+                elif ruta.startswith("/feeds/"):
+                    estado, cuerpo_feed, etag = simulados.feed(int(ruta.rsplit("/", 1)[-1].split(".")[0]),
+                                                               self.headers.get("If-None-Match", ""))
+                    simulados._contar(f"feed {estado}")
+                    self.send_response(estado)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Type", "application/rss+xml")
+                    self.send_header("Content-Length", str(len(cuerpo_feed)))
+                    self.end_headers()
+                    self.wfile.write(cuerpo_feed)
+                elif ruta == "/customsearch/v1":
+                    simulados._contar("busqueda")
+                    self._responder(simulados.busqueda())
+                else:
+                    self._responder({"error": "ruta desconocida"}, 404)
+
+            do_GET = _atender
+            do_POST = _atender
+
+            def log_message(self, *args):
+                pass
+
+        return Manejador
+
+
+def construir_pipeline_diminuto(tokenizador: str):
+    """
+    SDXL con la misma estructura que el real pero con pesos aleatorios y unos pocos canales
+    (la configuración de los tests de diffusers): mide el camino de código, no la calidad.
+    """
+    import torch
+    from diffusers import AutoencoderKL, EulerDiscreteScheduler, StableDiffusionXLPipeline, UNet2DConditionModel
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTextModelWithProjection, CLIPTokenizer
+
+    torch.manual_seed(0)
+    unet = UNet2DConditionModel(
+        block_out_channels=(2, 4), layers_per_block=2, sample_size=32, in_channels=4, out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"), up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        attention_head_dim=(2, 4), use_linear_projection=True, addition_embed_type="text_time",
+        addition_time_embed_dim=8, transformer_layers_per_block=(1, 2),
+        projection_class_embeddings_input_dim=80, cross_attention_dim=64, norm_num_groups=1,
+    )
+    scheduler = EulerDiscreteScheduler(beta_start=0.00085, beta_end=0.012, steps_offset=1,
+                                       beta_schedule="scaled_linear", timestep_spacing="leading")
+    vae = AutoencoderKL(
+        block_out_channels=[32, 64], in_channels=3, out_channels=3, latent_channels=4, sample_size=128,
+        down_block_types=["DownEncoderBlock2D"] * 2, up_block_types=["UpDecoderBlock2D"] * 2,
+    )
+    configuracion = CLIPTextConfig(
+        bos_token_id=0, eos_token_id=2, hidden_size=32, intermediate_size=37, layer_norm_eps=1e-05,
+        num_attention_heads=4, num_hidden_layers=5, pad_token_id=1, vocab_size=1000,
+        hidden_act="gelu", projection_dim=32,
+    )
+    pipe = StableDiffusionXLPipeline(
+        vae=vae, unet=unet, scheduler=scheduler,
+        text_encoder=CLIPTextModel(configuracion), tokenizer=CLIPTokenizer.from_pretrained(tokenizador),
+        text_encoder_2=CLIPTextModelWithProjection(configuracion), tokenizer_2=CLIPTokenizer.from_pretrained(tokenizador),
+    )
+    pipe.set_progress_bar_config(disable=True)
+    return pipe.to("cpu")
+
+
+async def medir_noticias(modulo, repeticiones: int) -> dict:
+    etapas: Dict[str, List[float]] = {}
+    totales = []
+    publicadas = 0
+    for _ in range(repeticiones):
+        duraciones = {}
+        inicio = time.perf_counter()
+        url = await modulo.enviar_noticia(duraciones)
+        totales.append(time.perf_counter() - inicio)
+        publicadas += url is not None
+        for etapa, segundos in duraciones.items():
+            etapas.setdefault(etapa, []).append(segundos)
+    total = sum(totales)
+    return {
+        "publicadas": publicadas,
+        "latencia_total": _resumen_latencias(totales),
+        "etapas": {etapa: _resumen_latencias(valores) for etapa, valores in etapas.items()},
+        "noticias_por_hora": round(publicadas / total * 3600, 1) if total else 0.0,
+    }
+
+
+async def medir_chat(bot_chat, url_telegram: str, mensajes: int, usuarios: int) -> dict:
+    """
+    Ráfaga de `mensajes` mensajes privados repartidos entre `usuarios` chats, todos a la vez.
+    Entran por la cola de actualizaciones de la misma Application que arranca el bot (con su
+    concurrencia), como si llegaran por polling, y responden contra la API simulada.
+    """
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    app = bot_chat.construir_aplicacion("123:bench", base_url=url_telegram)
+    llegadas: Dict[int, float] = {}
+    latencias = []
+
+    async def fin_de_mensaje(update, context):
+        latencias.append(time.perf_counter() - llegadas[update.update_id])
+
+    # En un grupo posterior: se ejecuta cuando `responder` ya ha terminado con ese mensaje
+    app.add_handler(TypeHandler(Update, fin_de_mensaje), group=1)
+
+    def mensaje(i: int) -> Update:
+        id_chat = 1000 + i % usuarios
+        usuario = {"id": id_chat, "is_bot": False, "first_name": "Bench", "username": f"bench{id_chat}"}
+        return Update.de_json({
+            "update_id": i,
+            "message": {
+                "message_id": i, "date": int(time.time()), "text": f"Pregunta de prueba número {i}",
+                "chat": {"id": id_chat, "type": "private", "username": usuario["username"]}, "from": usuario,
+            },
+        }, app.bot)
+
+    async with app:
+        await app.start()
+        inicio = time.perf_counter()
+        for i in range(mensajes):
+            llegadas[i] = time.perf_counter()
+            await app.update_queue.put(mensaje(i))
+        await app.update_queue.join()
+        total = time.perf_counter() - inicio
+        await app.stop()
+    return {
+        "mensajes": mensajes,
+        "usuarios": usuarios,
+        "latencia": _resumen_latencias(latencias),
+        "respuestas_por_segundo": round(mensajes / total, 3) if total else 0.0,
+        "planificador": bot_chat.PLANIFICADOR.estadisticas(),
+    }
+
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO_REPO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def ejecutar(nombre_escenario: str, script: str, tokenizador: str, semilla: int) -> dict:
+    escenario = ESCENARIOS[nombre_escenario]
+    simulados = ServidoresSimulados(escenario, semilla)
+    simulados.arrancar()
+
+    # Todo lo que escriben los scripts (historial, bandeja, caché) va a un directorio temporal
+    os.chdir(tempfile.mkdtemp(prefix="benchmark_noticias_"))
+    sys.path.insert(0, str(DIRECTORIO_REPO))
+    os.environ.update({
+        "OLLAMA_URL": f"{simulados.url}/ollama",
+        "OLLAMA_NUM_PARALLEL": str(escenario["paralelo_llm"]),
+        "TELEGRAM_TOKEN": "123:bench",
+        "TELEGRAM_CHAT_ID": "1",
+        "TELEGRAM_API_URL": f"{simulados.url}/telegram/bot",
+        "TELEGRAM_MENSAJES_POR_MINUTO": "60000",
+        "GOOGLE_API_KEY": "bench",
+        "GOOGLE_CX_ID": "bench",
+        "GOOGLE_SEARCH_URL": f"{simulados.url}/customsearch/v1",
+        "FUENTES_RSS": f"{simulados.url}/feeds/0.xml,{simulados.url}/feeds/1.xml",
+        # Sin caché ni servidor de imágenes: se mide el trabajo completo en este proceso
+        "CACHE_LLM": "0",
+        "CACHE_BUSQUEDA": "0",
+        "SERVIDOR_IMAGENES_PUERTO": "1",
+    })
+    # metricas ya leyó METRICAS_TEXTFILE al importarse: quitar la variable no basta para no
+    # sobrescribir el fichero de producción
+    os.environ.pop("METRICAS_TEXTFILE", None)
+    metricas.ARCHIVO_TEXTFILE = None
+    random.seed(semilla)
+
+    inicio = time.perf_counter()
+    import imagen_sdxl
+    modulo = __import__(script)
+    import telegram_message_bot
+    arranque = time.perf_counter() - inicio
+
+    imagen_sdxl.PIPE = construir_pipeline_diminuto(tokenizador)
+    # El presupuesto CLIP cuenta con los mismos tokenizadores diminutos: sin esto descargaría
+    # los de SDXL y el resultado dependería de la red
+    import presupuesto_clip
+    presupuesto_clip.TOKENIZADORES = [imagen_sdxl.PIPE.tokenizer, imagen_sdxl.PIPE.tokenizer_2]
+    imagen_sdxl.ANCHO = imagen_sdxl.ALTO = escenario["lado_imagen"]
+
+    async def principal():
+        noticias = await medir_noticias(modulo, escenario["noticias"])
+        rss_noticias = pico_rss_mb()
+        chat = await medir_chat(telegram_message_bot, f"{simulados.url}/telegram/bot",
+                                escenario["mensajes_chat"], escenario["usuarios_chat"])
+        return noticias, rss_noticias, chat
+
+    noticias, rss_noticias, chat = asyncio.run(principal())
+    simulados.parar()
+
+    memoria = {"pico_rss_mb": pico_rss_mb(), "pico_rss_tras_noticias_mb": rss_noticias}
+    import torch
+    if torch.cuda.is_available():
+        memoria["pico_gpu_mb"] = round(torch.cuda.max_memory_allocated() / 1024 / 1024, 1)
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_actual(),
+        "script": script,
+        "escenario": nombre_escenario,
+        "parametros": escenario,
+        "python": sys.version.split()[0],
+        "arranque_s": round(arranque, 3),
+        "noticia": noticias,
+        "chat": chat,
+        "memoria": memoria,
+        "peticiones_simuladas": dict(sorted(simulados.peticiones.items())),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sin conexión de NoticiasBot")
+    parser.add_argument("--escenario", choices=sorted(ESCENARIOS), default="rapido")
+    parser.add_argument("--script", choices=["crear_noticia_ollama", "crear_noticia_gcp"], default="crear_noticia_ollama")
+    parser.add_argument("--tokenizador", default="hf-internal-testing/tiny-random-clip",
+                        help="Tokenizador CLIP diminuto para el SDXL aleatorio (se descarga una vez)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="Fichero donde guardar también el JSON")
+    args = parser.parse_args()
+    # ejecutar() cambia al directorio temporal: la ruta de salida se resuelve antes
+    salida = Path(args.salida).resolve() if args.salida else None
+
+    resultado = ejecutar(args.escenario, args.script, args.tokenizador, args.semilla)
+    texto = json.dumps(resultado, ensure_ascii=False)
+    if salida:
+        salida.write_text(json.dumps(resultado, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(texto)
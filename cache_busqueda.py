@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    # La cuota de Custom Search se reinicia a medianoche, hora del Pacífico
+    ZONA_CUOTA = ZoneInfo("America/Los_Angeles")
+except (ImportError, ZoneInfoNotFoundError):
+    ZONA_CUOTA = timezone.utc
+
+# 🔎 Caché de respuestas de Google Custom Search y contabilidad de la cuota diaria (100 consultas
+# gratis al día). Con dateRestrict=d1 los resultados apenas cambian en una hora: dentro del TTL se
+# reutiliza la respuesta guardada y, si queda poca cuota, se usa la última guardada aunque haya caducado.
+RUTA_CACHE = os.getenv("CACHE_BUSQUEDA_RUTA", "cache_busqueda.sqlite3")
+TTL_MIN = float(os.getenv("CACHE_BUSQUEDA_TTL_MIN", "60"))
+CUOTA_DIARIA = int(os.getenv("BUSQUEDA_CUOTA_DIARIA", "100"))
+# Consultas que se dejan sin gastar (para pruebas a mano u otros procesos)
+CUOTA_RESERVA = int(os.getenv("BUSQUEDA_CUOTA_RESERVA", "5"))
+# Respuestas más antiguas que esto no se usan ni siquiera sin cuota
+MAX_DIAS_GUARDADO = 7
+# CACHE_BUSQUEDA=0 desactiva caché y contabilidad (cada búsqueda va a la API)
+ACTIVA = os.getenv("CACHE_BUSQUEDA", "1") != "0"
+
+
+def clave_busqueda(parametros: dict) -> str:
+    """
+    La clave de API no forma parte de la clave: la misma consulta con otra clave da lo mismo.
+    """
+    contenido = json.dumps({k: v for k, v in parametros.items() if k != "key"}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def dia_cuota() -> str:
+    return datetime.now(ZONA_CUOTA).date().isoformat()
+
+
+class CacheBusqueda:
+    """
+    Dos tablas SQLite: las respuestas (JSON tal cual lo devuelve la API) y las consultas gastadas
+    por día. La reserva de cuota es una sola sentencia, así que vale entre procesos.
+    """
+
+    def __init__(self, ruta: str = RUTA_CACHE, ttl_min: float = TTL_MIN,
+                 cuota_diaria: int = CUOTA_DIARIA, reserva: int = CUOTA_RESERVA):
+        self.ttl = ttl_min * 60
+        self.limite = cuota_diaria - reserva
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=10, check_same_thread=False)
+        with self._conexion:
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas ("
+                "clave TEXT PRIMARY KEY, respuesta TEXT NOT NULL, creado REAL NOT NULL)"
+            )
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS cuota (dia TEXT PRIMARY KEY, usadas INTEGER NOT NULL)"
+            )
+
+    def obtener(self, parametros: dict, caducadas: bool = False) -> Optional[Tuple[dict, float]]:
+        """
+        (respuesta, antigüedad en segundos) si hay una vigente; con `caducadas`, la última guardada.
+        """
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave_busqueda(parametros),)
+            ).fetchone()
+        if fila is None:
+            return None
+        edad = time.time() - fila[1]
+        if edad > (MAX_DIAS_GUARDADO * 86400 if caducadas else self.ttl):
+            return None
+        return json.loads(fila[0]), edad
+
+    def guardar(self, parametros: dict, respuesta: dict):
+        ahora = time.time()
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?)",
+                (clave_busqueda(parametros), json.dumps(respuesta, ensure_ascii=False), ahora)
+            )
+            self._conexion.execute("DELETE FROM respuestas WHERE creado < ?", (ahora - MAX_DIAS_GUARDADO * 86400,))
+
+    def reservar_consulta(self) -> bool:
+        """
+        Apunta una consulta en la cuota de hoy si aún cabe; False si ya se llegó al límite.
+        """
+        if self.limite <= 0:
+            return False
+        dia = dia_cuota()
+        with self._lock, self._conexion:
+            cursor = self._conexion.execute(
+                "INSERT INTO cuota VALUES (?, 1) ON CONFLICT(dia) DO UPDATE SET usadas = usadas + 1 "
+                "WHERE usadas < ?", (dia, self.limite)
+            )
+            if cursor.rowcount:
+                self._conexion.execute("DELETE FROM cuota WHERE dia < ?", (dia,))
+            return cursor.rowcount > 0
+
+    def usadas_hoy(self) -> int:
+        with self._lock:
+            fila = self._conexion.execute("SELECT usadas FROM cuota WHERE dia = ?", (dia_cuota(),)).fetchone()
+        return fila[0] if fila else 0
+
+
+_cache: Optional[CacheBusqueda] = None
+_lock_cache = threading.Lock()
+
+
+def obtener_cache_busqueda() -> Optional[CacheBusqueda]:
+    """
+    Caché única por proceso, o None si está desactivada con CACHE_BUSQUEDA=0.
+    """
+    global _cache
+    if not ACTIVA:
+        return None
+    with _lock_cache:
+        if _cache is None:
+            _cache = CacheBusqueda()
+        return _cache
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+from metricas import METRICAS
+
+# 💾 Caché en disco de respuestas del LLM, direccionada por contenido (modelo + prompt + opciones)
+RUTA_CACHE = os.getenv("CACHE_LLM_RUTA", "cache_llm.sqlite3")
+MAX_MB = float(os.getenv("CACHE_LLM_MAX_MB", "50"))
+TTL_HORAS = float(os.getenv("CACHE_LLM_TTL_HORAS", str(7 * 24)))
+# CACHE_LLM=0 desactiva la caché por completo; CACHE_LLM_REFRESCAR=1 ignora lo guardado
+# pero sigue guardando las respuestas nuevas (útil para una ejecución "en limpio")
+ACTIVA = os.getenv("CACHE_LLM", "1") != "0"
+REFRESCAR = os.getenv("CACHE_LLM_REFRESCAR", "0") == "1"
+
+
+def clave_cache(model_name: str, prompt: str, opciones: dict) -> str:
+    contenido = json.dumps({"model": model_name, "prompt": prompt, "opciones": opciones},
+                           sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheLLM:
+    """
+    Tabla SQLite con las respuestas; se expulsan las caducadas (TTL) y, si se supera el tamaño
+    máximo, las menos usadas recientemente (LRU).
+    """
+
+    def __init__(self, ruta: str = RUTA_CACHE, max_mb: float = MAX_MB, ttl_horas: float = TTL_HORAS,
+                 leer: bool = not REFRESCAR):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl_horas * 3600
+        self.leer = leer
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=10, check_same_thread=False)
+        with self._conexion:
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas ("
+                "clave TEXT PRIMARY KEY, respuesta TEXT NOT NULL, tam INTEGER NOT NULL, "
+                "creado REAL NOT NULL, ultimo_uso REAL NOT NULL)"
+            )
+            self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_uso ON respuestas (ultimo_uso)")
+
+    def obtener(self, model_name: str, prompt: str, opciones: dict) -> Optional[str]:
+        if not self.leer:
+            return None
+        clave = clave_cache(model_name, prompt, opciones)
+        ahora = time.time()
+        with self._lock, self._conexion:
+            fila = self._conexion.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None or ahora - fila[1] > self.ttl:
+                if fila is not None:
+                    self._conexion.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                self.fallos += 1
+                METRICAS.incrementar("noticiasbot_cache_llm_fallos_total")
+                return None
+            self._conexion.execute("UPDATE respuestas SET ultimo_uso = ? WHERE clave = ?", (ahora, clave))
+            self.aciertos += 1
+            METRICAS.incrementar("noticiasbot_cache_llm_aciertos_total")
+            return fila[0]
+
+    def guardar(self, model_name: str, prompt: str, opciones: dict, respuesta: str):
+        clave = clave_cache(model_name, prompt, opciones)
+        ahora = time.time()
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?)",
+                (clave, respuesta, len(respuesta.encode("utf-8")), ahora, ahora)
+            )
+            self._expulsar(ahora)
+
+    def _expulsar(self, ahora: float):
+        self._conexion.execute("DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl,))
+        total = self._conexion.execute("SELECT COALESCE(SUM(tam), 0) FROM respuestas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        sobrante = total - self.max_bytes
+        claves = []
+        for clave, tam in self._conexion.execute("SELECT clave, tam FROM respuestas ORDER BY ultimo_uso"):
+            claves.append((clave,))
+            sobrante -= tam
+            if sobrante <= 0:
+                break
+        self._conexion.executemany("DELETE FROM respuestas WHERE clave = ?", claves)
+
+    def imprimir_estadisticas(self):
+        total = self.aciertos + self.fallos
+        tasa = self.aciertos / total * 100 if total else 0.0
+        print(f"💾 Caché LLM: {self.aciertos} aciertos, {self.fallos} fallos ({tasa:.0f}% aciertos)")
+
+
+_cache: Optional[CacheLLM] = None
+_lock_cache = threading.Lock()
+
+
+def obtener_cache_llm() -> Optional[CacheLLM]:
+    """
+    Caché única por proceso, o None si está desactivada con CACHE_LLM=0.
+    """
+    global _cache
+    if not ACTIVA:
+        return None
+    with _lock_cache:
+        if _cache is None:
+            _cache = CacheLLM()
+        return _cache
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import asyncio
+import functools
+import threading
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+from requests.adapters import HTTPAdapter
+from metricas import METRICAS
+
+# 🧠 Cliente HTTP compartido para Ollama (scripts de noticias y bot de chat)
+URL_OLLAMA = os.getenv("OLLAMA_URL", "http://localhost:11434")
+TIMEOUT_CONEXION = float(os.getenv("OLLAMA_TIMEOUT_CONEXION", "3.05"))
+TIMEOUT_LECTURA = float(os.getenv("OLLAMA_TIMEOUT_LECTURA", "180"))
+MAX_EN_VUELO = int(os.getenv("OLLAMA_MAX_EN_VUELO", "2"))
+
+
+def normalizar_keep_alive(valor: Union[int, float, str, None]) -> Union[int, float, str, None]:
+    """
+    Ollama acepta segundos como número o una duración con unidad ("10m", "-1m"); un número
+    como texto ("-1") lo rechaza, así que se convierte a número.
+    """
+    if valor is None or not str(valor).strip():
+        return None
+    for tipo in (int, float):
+        try:
+            return tipo(valor)
+        except ValueError:
+            pass
+    return str(valor).strip()
+
+
+# Cuánto mantiene Ollama el modelo en memoria tras cada petición (p. ej. -1 = siempre, "10m")
+KEEP_ALIVE = normalizar_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE"))
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+class ClienteOllama:
+    """
+    Mantiene conexiones keep-alive con Ollama, aplica timeouts de conexión y lectura por separado
+    y limita las peticiones simultáneas (compartido entre llamadas síncronas y asíncronas).
+    """
+
+    def __init__(self, url_base: str = URL_OLLAMA, timeout_conexion: float = TIMEOUT_CONEXION,
+                 timeout_lectura: float = TIMEOUT_LECTURA, max_en_vuelo: int = MAX_EN_VUELO):
+        self.url_base = url_base.rstrip("/")
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.keep_alive = KEEP_ALIVE
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_en_vuelo)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+        self._semaforo = threading.BoundedSemaphore(max_en_vuelo)
+        # Hilos propios para las llamadas asíncronas: el ejecutor por defecto de asyncio tiene
+        # pocos hilos con pocas CPU y pondría otra cola delante del semáforo
+        self._hilos = ThreadPoolExecutor(max_workers=max_en_vuelo, thread_name_prefix="ollama")
+        self._lock = threading.Lock()
+        # Últimas duraciones: total de la llamada, espera por un hueco y sobrecoste fuera del modelo
+        self._duraciones = deque(maxlen=1000)
+        self._esperas = deque(maxlen=1000)
+        self._sobrecostes = deque(maxlen=1000)
+        self.llamadas = 0
+        self.errores = 0
+
+    def post(self, ruta: str, payload: dict, timeout_lectura: Optional[float] = None) -> dict:
+        timeout = (self.timeout[0], timeout_lectura or self.timeout[1])
+        inicio_espera = time.perf_counter()
+        with self._semaforo:
+            inicio = time.perf_counter()
+            try:
+                response = self.sesion.post(f"{self.url_base}{ruta}", json=payload, timeout=timeout)
+                response.raise_for_status()
+                datos = response.json()
+            except (requests.exceptions.RequestException, ValueError):
+                with self._lock:
+                    self.errores += 1
+                METRICAS.incrementar("noticiasbot_llm_errores_total", ruta=ruta)
+                raise
+            fin = time.perf_counter()
+
+        METRICAS.incrementar("noticiasbot_llm_llamadas_total", ruta=ruta)
+        METRICAS.observar("noticiasbot_llm_segundos", fin - inicio, ruta=ruta)
+        with self._lock:
+            self.llamadas += 1
+            self._esperas.append(inicio - inicio_espera)
+            self._duraciones.append(fin - inicio)
+            # /api/chat informa del tiempo que pasó dentro del modelo (en nanosegundos)
+            if "total_duration" in datos:
+                self._sobrecostes.append(max(0.0, (fin - inicio) - datos["total_duration"] / 1e9))
+        return datos
+
+    async def _en_hilo(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._hilos, functools.partial(funcion, *args))
+
+    async def post_async(self, ruta: str, payload: dict, timeout_lectura: Optional[float] = None) -> dict:
+        return await self._en_hilo(self.post, ruta, payload, timeout_lectura)
+
+    def chat(self, prompt: str, model_name: str = "mistral", **opciones) -> str:
+        """
+        Llamada a la API nativa /api/chat. Las opciones extra van al payload tal cual.
+        """
+        payload = {
+            "model": model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": False,
+            **opciones
+        }
+        if self.keep_alive is not None:
+            payload.setdefault("keep_alive", self.keep_alive)
+        return self.post("/api/chat", payload)["message"]["content"].strip()
+
+    async def chat_async(self, prompt: str, model_name: str = "mistral", **opciones) -> str:
+        return await self._en_hilo(functools.partial(self.chat, **opciones), prompt, model_name)
+
+    def precargar(self, model_name: str = "mistral", keep_alive: Union[int, float, str] = -1):
+        """
+        Carga el modelo en Ollama sin generar nada y lo mantiene residente, también en las
+        peticiones siguientes de este cliente (solo si la precarga se aceptó).
+        """
+        keep_alive = normalizar_keep_alive(keep_alive)
+        self.post("/api/generate", {"model": model_name, "keep_alive": keep_alive})
+        self.keep_alive = keep_alive
+
+    def chat_openai(self, prompt: str, model_name: str, temperature: float = 0.7) -> str:
+        """
+        Llamada a la API compatible con OpenAI (/v1/chat/completions).
+        """
+        payload = {
+            "model": model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+        }
+        return self.post("/v1/chat/completions", payload)["choices"][0]["message"]["content"]
+
+    async def chat_openai_async(self, prompt: str, model_name: str, temperature: float = 0.7) -> str:
+        return await self._en_hilo(self.chat_openai, prompt, model_name, temperature)
+
+    def estadisticas(self) -> Dict[str, float]:
+        with self._lock:
+            duraciones = list(self._duraciones)
+            esperas = list(self._esperas)
+            sobrecostes = list(self._sobrecostes)
+            return {
+                "llamadas": self.llamadas,
+                "errores": self.errores,
+                "p50": _percentil(duraciones, 0.50),
+                "p95": _percentil(duraciones, 0.95),
+                "max": max(duraciones, default=0.0),
+                "espera_p95": _percentil(esperas, 0.95),
+                "sobrecoste_p50": _percentil(sobrecostes, 0.50),
+            }
+
+    def imprimir_estadisticas(self):
+        e = self.estadisticas()
+        print(f"📊 Ollama: {e['llamadas']} llamadas, {e['errores']} errores | "
+              f"p50 {e['p50']:.2f}s, p95 {e['p95']:.2f}s, máx {e['max']:.2f}s | "
+              f"espera p95 {e['espera_p95']:.3f}s, sobrecoste p50 {e['sobrecoste_p50']:.3f}s")
+
+
+_cliente: Optional[ClienteOllama] = None
+_lock_cliente = threading.Lock()
+
+
+def obtener_cliente() -> ClienteOllama:
+    """
+    Cliente único por proceso, para que todas las llamadas compartan el pool de conexiones.
+    """
+    global _cliente
+    with _lock_cliente:
+        if _cliente is None:
+            _cliente = ClienteOllama()
+        return _cliente
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+from io import BytesIO
+from functools import lru_cache
+from typing import NamedTuple
+from PIL import Image, ImageDraw
+from metricas import METRICAS
+
+# 🗜️ Codificación de la imagen para Telegram: recomprime las fotos de todos modos, así que
+# enviamos JPEG/WebP con la mayor calidad que quepa en un presupuesto de bytes.
+FORMATO = os.getenv("IMAGEN_FORMATO", "jpeg").lower()
+MAX_KB = int(os.getenv("IMAGEN_MAX_KB", "250"))
+CALIDAD_MAX = int(os.getenv("IMAGEN_CALIDAD_MAX", "90"))
+CALIDAD_MIN = int(os.getenv("IMAGEN_CALIDAD_MIN", "50"))
+PROGRESIVA = os.getenv("IMAGEN_PROGRESIVA", "1") == "1"
+
+ANCHO_ERROR = 896
+ALTO_ERROR = 512
+
+
+class ImagenCodificada(NamedTuple):
+    datos: bytes
+    formato: str
+    calidad: int
+    segundos: float
+
+
+def _codificar(image: Image.Image, formato: str, calidad: int, progresiva: bool) -> bytes:
+    buffer = BytesIO()
+    if formato == "jpeg":
+        image.convert("RGB").save(buffer, format="JPEG", quality=calidad, progressive=progresiva, optimize=True)
+    elif formato == "webp":
+        image.save(buffer, format="WEBP", quality=calidad, method=4)
+    else:
+        image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def codificar_imagen(image: Image.Image, formato: str = FORMATO, max_bytes: int = MAX_KB * 1024,
+                     calidad_max: int = CALIDAD_MAX, calidad_min: int = CALIDAD_MIN,
+                     progresiva: bool = PROGRESIVA) -> ImagenCodificada:
+    """
+    Busca (por bisección) la mayor calidad entre calidad_min y calidad_max cuyo resultado no pase
+    de max_bytes. PNG no tiene calidad y se codifica tal cual.
+    """
+    inicio = time.perf_counter()
+    if formato == "png":
+        datos, calidad = _codificar(image, formato, 0, progresiva), 0
+    else:
+        datos = _codificar(image, formato, calidad_max, progresiva)
+        calidad = calidad_max
+        if len(datos) > max_bytes:
+            bajo, alto = calidad_min, calidad_max - 1
+            mejor = None
+            while bajo <= alto:
+                medio = (bajo + alto) // 2
+                intento = _codificar(image, formato, medio, progresiva)
+                if len(intento) <= max_bytes:
+                    mejor = (intento, medio)
+                    bajo = medio + 1
+                else:
+                    alto = medio - 1
+            if mejor is None:
+                print(f"⚠️ Ni con calidad {calidad_min} cabe en {max_bytes // 1024} KB; se envía igualmente")
+                mejor = (_codificar(image, formato, calidad_min, progresiva), calidad_min)
+            datos, calidad = mejor
+    segundos = time.perf_counter() - inicio
+    METRICAS.incrementar("noticiasbot_imagen_bytes_total", len(datos), formato=formato)
+    print(f"🗜️ Imagen codificada en {formato.upper()} (calidad {calidad}): "
+          f"{len(datos) / 1024:.0f} KB en {segundos * 1000:.0f} ms")
+    return ImagenCodificada(datos, formato, calidad, segundos)
+
+
+@lru_cache(maxsize=1)
+def imagen_error() -> bytes:
+    """
+    Imagen gris de respaldo, codificada una sola vez por proceso.
+    """
+    img = Image.new('RGB', (ANCHO_ERROR, ALTO_ERROR), color='gray')
+    d = ImageDraw.Draw(img)
+    d.text((10, 10), "Error generando imagen", fill=(255, 255, 255))
+    return codificar_imagen(img).datos
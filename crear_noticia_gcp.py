@@ -1,18 +1,23 @@
 # -*- coding: utf-8 -*-
 import os
-import json
 import time
-import torch
-import asyncio
-import requests
+import uuid
+# metricas solo usa la biblioteca estándar y marca el inicio del proceso: va primero
+from metricas import METRICAS, medir_duracion
 from pathlib import Path
 from datetime import datetime
-from PIL import Image, ImageDraw
-from telegram import Bot
-from typing import List, Tuple
-from io import BytesIO
-from contextlib import contextmanager
-from diffusers import StableDiffusionXLPipeline
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from imagen_sdxl import cargar_pipeline
+from servidor_imagenes import servidor_en_marcha
+from entidades import BuscadorEntidades, cargar_entidades
+from ingesta_noticias import IngestaNoticias
+from puntuacion_noticias import PuntuadorNoticias
+from presupuesto_clip import PRIORIDAD_FIJA, Segmento, ajustar_prompt, obtener_tokenizadores
+from orquestador_noticias import OrquestadorNoticias, modelo_llm
 import asyncio
 
 # Variables desde entorno (ya vienen desde Secret Manager)
@@ -20,13 +25,14 @@ TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 GOOGLE_CX_ID = os.environ.get("GOOGLE_CX_ID")
+# Permiten apuntar a servidores locales (p. ej. los simulados de benchmark.py)
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+GOOGLE_SEARCH_URL = os.environ.get("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
 
 if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
     raise ValueError("Faltan TELEGRAM_TOKEN o TELEGRAM_CHAT_ID en las variables de entorno")
 
-bot = Bot(token=TELEGRAM_TOKEN)
-ARCHIVO_NOTICIAS = "noticias_publicadas.json"
-PIPE = None
+INGESTA = IngestaNoticias(GOOGLE_SEARCH_URL, GOOGLE_API_KEY, GOOGLE_CX_ID)
 
 MARCAS_PRIORITARIAS = {
     "OpenAI": "a futuristic lab inspired by OpenAI",
@@ -51,93 +57,30 @@ MARCAS_PRIORITARIAS = {
     "LLaMA": "a Meta AI research interface inspired by LLaMA"
 }
 
-
-
-@contextmanager
-def medir_duracion(etiqueta):
-    inicio = time.time()
-    yield
-    fin = time.time()
-    print(f"⏱ Tiempo en {etiqueta}: {fin - inicio:.2f} segundos")
-
-def contar_tokens_estimada(prompt: str) -> int:
-    return len(prompt.replace(",", "").split())
-
-def modelo_llm(prompt: str, model_name: str = "mistral") -> str:
-    url = "http://localhost:11434/api/chat"
-    payload = {
-        "model": model_name,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False
-    }
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json()["message"]["content"].strip()
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error al conectar con Ollama: {e}")
-        return ""
-
-def obtener_noticias_reales_google(query="latest AI agent news") -> List[Tuple[str, str, datetime, str]]:
-    if not GOOGLE_API_KEY or not GOOGLE_CX_ID:
+# Alias de marcas desde entidades.json; el buscador se compila una sola vez al importar
+ENTIDADES = cargar_entidades(str(Path(__file__).resolve().parent / "entidades.json"))
+ORDEN_MARCAS = {nombre: i for i, nombre in enumerate(MARCAS_PRIORITARIAS)}
+BUSCADOR_ENTIDADES = BuscadorEntidades({
+    "marca": {nombre: ENTIDADES.get("marca", {}).get(nombre, []) for nombre in MARCAS_PRIORITARIAS},
+})
+
+def obtener_noticias_reales_google(query: Optional[str] = None, pagina: int = 0) -> List[Tuple[str, str, datetime, str]]:
+    """
+    Reúne las candidatas de todas las fuentes a la vez (CONSULTAS_BUSQUEDA o `query`, y FUENTES_RSS);
+    con `pagina` > 0, los siguientes resultados de Google.
+    Es síncrona: desde código asíncrono, con asyncio.to_thread.
+    """
+    if not INGESTA.busqueda_configurada:
         print("❌ Faltan claves de API.")
-        return []
-
-    print(f"Buscando noticias reales en Google con el término: '{query}'")
-    url = f"https://www.googleapis.com/customsearch/v1?key={GOOGLE_API_KEY}&cx={GOOGLE_CX_ID}&q={query}&num=5&dateRestrict=d1&lr=lang_en"
-
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        search_results = response.json()
-        noticias = []
-        for item in search_results.get('items', []):
-            titulo = item.get('title', '')
-            contenido = item.get('snippet', '')
-            enlace = item.get('link', '')
-            publicado = datetime.now()
-            noticias.append((titulo, contenido, publicado, enlace))
-        return noticias
-    except requests.exceptions.RequestException as e:
-        print(f"Error al conectar con la API de Google: {e}")
-        return []
-
-def url_ya_publicada(url: str) -> bool:
-    if not Path(ARCHIVO_NOTICIAS).exists():
-        return False
-    with open(ARCHIVO_NOTICIAS, "r", encoding="utf-8") as f:
-        try:
-            noticias = json.load(f)
-        except json.JSONDecodeError:
-            return False
-
-    return any(n["url"] == url for n in noticias)
+        if not INGESTA.fuentes:
+            return []
 
-
-def guardar_noticia_publicada(titulo: str, url: str):
-    noticia = {
-        "titulo": titulo,
-        "url": url,
-        "fecha": datetime.now().strftime("%Y-%m-%d")
-    }
-
-    if Path(ARCHIVO_NOTICIAS).exists():
-        with open(ARCHIVO_NOTICIAS, "r", encoding="utf-8") as f:
-            try:
-                noticias = json.load(f)
-            except json.JSONDecodeError:
-                noticias = []
+    consultas = [query] if query else INGESTA.consultas
+    if pagina:
+        print(f"Buscando más resultados en Google (página {pagina + 1})")
     else:
-        noticias = []
-
-    noticias.append(noticia)
-
-    # Limita a los últimos 100 registros por si crece mucho
-    noticias = noticias[-100:]
-
-    with open(ARCHIVO_NOTICIAS, "w", encoding="utf-8") as f:
-        json.dump(noticias, f, ensure_ascii=False, indent=2)
-
+        print(f"Buscando noticias reales en Google ({len(consultas)} consultas) y en {len(INGESTA.fuentes)} feeds")
+    return INGESTA.obtener_sincrono(consultas, pagina)
 
 def generar_conceptos_visual_llm(texto: str) -> List[str]:
     prompt = (
@@ -146,85 +89,139 @@ def generar_conceptos_visual_llm(texto: str) -> List[str]:
         f"News text:\n\"\"\"\n{texto}\n\"\"\""
     )
     respuesta = modelo_llm(prompt)
-    conceptos = [c.strip() for c in respuesta.split(',') if c.strip()]
+    return depurar_conceptos(respuesta.split(','))
+
+def depurar_conceptos(conceptos: List[str]) -> List[str]:
+    conceptos = [c.strip() for c in conceptos if c.strip()]
     return conceptos[:4]
 
 def construir_prompt_final(conceptos: List[str], texto_original: str) -> str:
-    base = f"A cinematic digital painting of {', '.join(conceptos)}"
-    for nombre, decorado in MARCAS_PRIORITARIAS.items():
-        if nombre.lower() in texto_original.lower():
-            base += f", featuring {decorado}"
+    # Cada trozo lleva una prioridad para poder recortar el prompt si no cabe en CLIP
+    segmentos = [Segmento(f"A cinematic digital painting of {', '.join(conceptos[:1])}", PRIORIDAD_FIJA)]
+    segmentos += [Segmento(c, 5 - i) for i, c in enumerate(conceptos[1:])]
+    marcas = BUSCADOR_ENTIDADES.entidades_en(texto_original, "marca")
+    if marcas:
+        marca = min(marcas, key=ORDEN_MARCAS.get)
+        segmentos.append(Segmento(f"featuring {MARCAS_PRIORITARIAS[marca]}", 4, corto=f"featuring {marca} logo"))
+    segmentos += [
+        Segmento("in the art style of a stylized, highly detailed, digital painting", 2, corto="digital painting"),
+        Segmento("no text", 7),
+        Segmento("cinematic lighting", 1),
+    ]
+    return ajustar_prompt(segmentos)
+
+ORQUESTADOR = OrquestadorNoticias(
+    TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_API_URL,
+    obtener_noticias=obtener_noticias_reales_google,
+    generar_conceptos=generar_conceptos_visual_llm,
+    depurar_conceptos=depurar_conceptos,
+    construir_prompt=construir_prompt_final,
+    # Ordena las candidatas por relevancia para el tema (con las marcas como términos del perfil)
+    puntuador=PuntuadorNoticias(terminos_extra=MARCAS_PRIORITARIAS),
+)
+enviar_noticia = ORQUESTADOR.enviar_noticia
+enviar_noticias_pipeline = ORQUESTADOR.enviar_noticias_pipeline
+
+# 🌐 Servicio HTTP: Cloud Scheduler llama a POST /publish y el trabajo se ejecuta en segundo plano
+MAX_TRABAJOS_GPU = int(os.environ.get("MAX_TRABAJOS_GPU", "1"))
+MAX_TRABAJOS_EN_COLA = int(os.environ.get("MAX_TRABAJOS_EN_COLA", "10"))
+# Los trabajos terminados se pueden consultar en /jobs durante un tiempo y luego se olvidan
+TRABAJOS_TTL_MIN = float(os.environ.get("TRABAJOS_TTL_MIN", "60"))
+MAX_TRABAJOS_TERMINADOS = int(os.environ.get("MAX_TRABAJOS_TERMINADOS", "200"))
+TRABAJOS: Dict[str, dict] = {}
+# id → instante (monotónico) en que terminó, del más antiguo al más reciente
+TERMINADOS: "OrderedDict[str, float]" = OrderedDict()
+COLA_TRABAJOS: "asyncio.Queue[str]" = asyncio.Queue()
+
+
+def purgar_trabajos():
+    limite = time.monotonic() - TRABAJOS_TTL_MIN * 60
+    while TERMINADOS:
+        id_trabajo, fin = next(iter(TERMINADOS.items()))
+        if fin > limite and len(TERMINADOS) <= MAX_TRABAJOS_TERMINADOS:
             break
-    return f"{base}, in the art style of a stylized, highly detailed, digital painting, no text, cinematic lighting"
-
-def generar_imagen_local(prompt: str) -> BytesIO:
-    global PIPE
-    try:
-        if PIPE is None:
-            modelo_id = "stabilityai/stable-diffusion-xl-base-1.0"
-            PIPE = StableDiffusionXLPipeline.from_pretrained(modelo_id, torch_dtype=torch.float16, variant="fp16")
-            PIPE.to("cuda" if torch.cuda.is_available() else "cpu")
-        image = PIPE(prompt=prompt, num_inference_steps=25, guidance_scale=6.0, height=512, width=896,
-            negative_prompt="text, watermark, blurry, deformed, duplicate, low quality").images[0]
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        return img_byte_arr
-    except Exception as e:
-        print(f"❌ Error generando imagen: {e}")
-        img = Image.new('RGB', (896, 512), color='gray')
-        d = ImageDraw.Draw(img)
-        d.text((10, 10), "Error generando imagen", fill=(255, 255, 255))
-        img_byte_arr = BytesIO()
-        img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        return img_byte_arr
-
-async def enviar_noticia():
-    print("🔍 Buscando noticia relevante en Google News...")
-    noticias = obtener_noticias_reales_google()
-    noticias = [n for n in noticias if not url_ya_publicada(n[3])]
-    if not noticias:
-        print("❌ No se encontró ninguna noticia.")
-        return
-    titulo_noticia, snippet, _, url_noticia = noticias[0]
-    texto = f"{titulo_noticia}. {snippet}"
-
-    with medir_duracion("generar resumen"):
-        resumen = modelo_llm(
-            "Resume en español esta noticia en tres partes separadas por nueva línea:\n"
-            "1. TÍTULO: (máximo 15 palabras, en español)\n"
-            "2. RESUMEN: (1–2 frases claras en español)\n"
-            "3. COMENTARIO: (análisis de impacto o contexto tambien en español)\n\n"
-            f"{texto}"
-        )
-    print("🧠 Resumen generado:\n", resumen)
-
-    with medir_duracion("extraer conceptos"):
-        conceptos = generar_conceptos_visual_llm(texto)
-    print("🔑 Conceptos visuales extraídos:", conceptos)
-
-    with medir_duracion("generar imagen"):
-        prompt = construir_prompt_final(conceptos, texto)
-        print("🎨 Prompt visual final:\n", prompt)
-        print("🧮 Tokens estimados para CLIP:", contar_tokens_estimada(prompt), "/ 77")
-        imagen = generar_imagen_local(prompt)
-
-    texto_telegram = (
-        f"{resumen}\n\n"
-        f"🗓 *Publicado:* {datetime.now().strftime('%d/%m/%Y %H:%M')}\n"
-        f"🔗 Fuente: {url_noticia}"
-    )
+        del TERMINADOS[id_trabajo]
+        TRABAJOS.pop(id_trabajo, None)
+
+
+async def trabajador_gpu():
+    """
+    Cada trabajador ejecuta un trabajo cada vez; con MAX_TRABAJOS_GPU=1 nunca hay dos
+    generaciones compitiendo por la GPU, y el bucle de eventos sigue atendiendo peticiones HTTP.
+    """
+    while True:
+        id_trabajo = await COLA_TRABAJOS.get()
+        trabajo = TRABAJOS[id_trabajo]
+        trabajo["estado"] = "en curso"
+        trabajo["inicio"] = datetime.now().isoformat(timespec="seconds")
+        inicio = time.perf_counter()
+        try:
+            if trabajo["todas"]:
+                await enviar_noticias_pipeline()
+            else:
+                trabajo["url"] = await enviar_noticia(trabajo["etapas"])
+            trabajo["estado"] = "completado"
+        except Exception as e:
+            print(f"❌ Error en el trabajo {id_trabajo}: {e}")
+            trabajo["estado"] = "error"
+            trabajo["error"] = str(e)
+        finally:
+            trabajo["fin"] = datetime.now().isoformat(timespec="seconds")
+            trabajo["duracion_s"] = round(time.perf_counter() - inicio, 2)
+            trabajo["etapas"] = {k: round(v, 2) for k, v in trabajo["etapas"].items()}
+            TERMINADOS[id_trabajo] = time.monotonic()
+            purgar_trabajos()
+            COLA_TRABAJOS.task_done()
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    # Cargamos el pipeline y los tokenizadores CLIP al arrancar, no en la primera petición
+    await asyncio.to_thread(obtener_tokenizadores)
+    if not servidor_en_marcha():
+        with medir_duracion("cargar pipeline SDXL"):
+            await asyncio.to_thread(cargar_pipeline)
+    trabajadores = [asyncio.create_task(trabajador_gpu()) for _ in range(MAX_TRABAJOS_GPU)]
+    yield
+    for tarea in trabajadores:
+        tarea.cancel()
+
+
+app = FastAPI(title="NoticiasBot", lifespan=ciclo_de_vida)
+
+
+@app.post("/publish", status_code=202)
+async def publicar(todas: bool = False):
+    if COLA_TRABAJOS.qsize() >= MAX_TRABAJOS_EN_COLA:
+        raise HTTPException(status_code=429, detail="Demasiados trabajos en cola")
+    purgar_trabajos()
+    id_trabajo = uuid.uuid4().hex
+    TRABAJOS[id_trabajo] = {
+        "id": id_trabajo,
+        "estado": "en cola",
+        "todas": todas,
+        "creado": datetime.now().isoformat(timespec="seconds"),
+        "etapas": {},
+    }
+    await COLA_TRABAJOS.put(id_trabajo)
+    return {"id": id_trabajo, "estado": "en cola", "posicion": COLA_TRABAJOS.qsize()}
+
+
+@app.get("/jobs/{id_trabajo}")
+async def estado_trabajo(id_trabajo: str):
+    if id_trabajo not in TRABAJOS:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return TRABAJOS[id_trabajo]
+
+
+@app.get("/health")
+async def salud():
+    return {"ok": True, "en_cola": COLA_TRABAJOS.qsize()}
 
-    with medir_duracion("enviar a Telegram"):
-        await bot.send_photo(
-            chat_id=TELEGRAM_CHAT_ID,
-            photo=imagen,
-            caption=texto_telegram,
-            parse_mode="Markdown"
-        )
 
-    guardar_noticia_publicada(titulo_noticia, url_noticia)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def exportar_metricas():
+    return METRICAS.texto_prometheus()
 
 
 import uvicorn
@@ -1,19 +1,23 @@
 # -*- coding: utf-8 -*-
 import os
-import json
-import time
-import torch
+import sys
 import asyncio
+# metricas solo usa la biblioteca estándar y marca el inicio del proceso: va primero
+from metricas import iniciar_servidor_metricas
 import requests
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
-from PIL import Image, ImageDraw
-from telegram import Bot
-from typing import List, Tuple
-from io import BytesIO
-from contextlib import contextmanager
-from diffusers import StableDiffusionXLPipeline
+from typing import List, Optional, Tuple
+from imagen_sdxl import cargar_pipeline
+from servidor_imagenes import servidor_en_marcha
+from cliente_ollama import obtener_cliente
+from planificador import Demonio
+from entidades import BuscadorEntidades, cargar_entidades
+from ingesta_noticias import IngestaNoticias
+from puntuacion_noticias import PuntuadorNoticias
+from presupuesto_clip import PRIORIDAD_FIJA, Segmento, ajustar_prompt, obtener_tokenizadores
+from orquestador_noticias import OrquestadorNoticias, modelo_llm
 import re
 
 # Cargar credenciales
@@ -22,12 +26,14 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GOOGLE_CX_ID = os.getenv("GOOGLE_CX_ID")
+# Permiten apuntar a servidores locales (p. ej. los simulados de benchmark.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+GOOGLE_SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
 
 if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
     raise ValueError("Faltan TELEGRAM_TOKEN o TELEGRAM_CHAT_ID en el .env")
 
-bot = Bot(token=TELEGRAM_TOKEN)
-ARCHIVO_NOTICIAS = "noticias_publicadas.json"
+INGESTA = IngestaNoticias(GOOGLE_SEARCH_URL, GOOGLE_API_KEY, GOOGLE_CX_ID)
 
 MARCAS_PRIORITARIAS = {
     "OpenAI": "a futuristic street scene with a glowing OpenAI billboard",
@@ -51,40 +57,26 @@ MARCAS_PRIORITARIAS = {
     "Vogue": "a fashion-forward avenue with a massive Vogue screen",
 }
 
-PIPE = None
-
-@contextmanager
-def medir_duracion(etiqueta):
-    inicio = time.time()
-    yield
-    fin = time.time()
-    print(f"⏱ Tiempo en {etiqueta}: {fin - inicio:.2f} segundos")
-
-def contar_tokens_estimada(prompt: str) -> int:
-    return len(prompt.replace(",", "").split())
-
-def modelo_llm(prompt: str, model_name: str = "mistral") -> str:
-    url = "http://localhost:11434/api/chat"
-    payload = {
-        "model": model_name,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False
-    }
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json()["message"]["content"].strip()
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error al conectar con Ollama: {e}")
-        return ""
+# Alias de marcas y lista de personas; el buscador se compila una sola vez al importar
+ENTIDADES = cargar_entidades(str(Path(__file__).resolve().parent / "entidades.json"))
+ORDEN_MARCAS = {nombre: i for i, nombre in enumerate(MARCAS_PRIORITARIAS)}
+BUSCADOR_ENTIDADES = BuscadorEntidades({
+    "marca": {nombre: ENTIDADES.get("marca", {}).get(nombre, []) for nombre in MARCAS_PRIORITARIAS},
+    "persona": ENTIDADES.get("persona", {}),
+})
 
 # 🔎 Obtener noticias desde una búsqueda de Google (implementación real)
-def obtener_noticias_reales_google(query="latest AI agent news") -> List[Tuple[str, str, datetime, str]]:
+def obtener_noticias_reales_google(query: Optional[str] = None, pagina: int = 0) -> List[Tuple[str, str, datetime, str]]:
     """
-    Realiza una búsqueda de Google para obtener noticias relevantes sobre IA y extrae la información.
+    Reúne las candidatas de todas las fuentes a la vez: las consultas de Google (CONSULTAS_BUSQUEDA,
+    o solo `query`) y los feeds de FUENTES_RSS; con `pagina` > 0, los siguientes resultados de Google.
+    Es síncrona: desde código asíncrono, con asyncio.to_thread.
     """
-    if not GOOGLE_API_KEY or not GOOGLE_CX_ID:
+    if not INGESTA.busqueda_configurada:
         print("❌ No se encontraron GOOGLE_API_KEY o GOOGLE_CX_ID en el archivo .env.")
+    if not INGESTA.busqueda_configurada and not INGESTA.fuentes:
+        if pagina:
+            return []
         print("Usando resultados simulados para la demostración.")
         simulated_results = [
             {"title": "AI in the workplace: what employees need to excel with intelligent agents", "snippet": "A new report from Microsoft details the future of AI in business, emphasizing the need for skilled employees to work alongside intelligent agents and Copilot...", "link": "https://www.example-news.com/microsoft-ai-agent", "date": "2025-08-02"},
@@ -103,61 +95,12 @@ def obtener_noticias_reales_google(query="latest AI agent news") -> List[Tuple[s
             noticias_simuladas.append((titulo, contenido, publicado, enlace))
         return noticias_simuladas
 
-    print(f"Buscando noticias reales en Google con el término: '{query}'")
-    url = f"https://www.googleapis.com/customsearch/v1?key={GOOGLE_API_KEY}&cx={GOOGLE_CX_ID}&q={query}&num=5&dateRestrict=d1&lr=lang_en"
-    
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        search_results = response.json()
-        
-        noticias = []
-        for item in search_results.get('items', []):
-            titulo = item.get('title', '')
-            contenido = item.get('snippet', '')
-            enlace = item.get('link', '')
-            publicado = datetime.now()
-            noticias.append((titulo, contenido, publicado, enlace))
-        
-        return noticias
-    except requests.exceptions.RequestException as e:
-        print(f"Error al conectar con la API de Google: {e}")
-        return []
-
-def url_ya_publicada(url: str) -> bool:
-    if not Path(ARCHIVO_NOTICIAS).exists():
-        return False
-    with open(ARCHIVO_NOTICIAS, "r", encoding="utf-8") as f:
-        try:
-            noticias = json.load(f)
-        except json.JSONDecodeError:
-            return False
-
-    return any(n["url"] == url for n in noticias)
-
-def guardar_noticia_publicada(titulo: str, url: str):
-    noticia = {
-        "titulo": titulo,
-        "url": url,
-        "fecha": datetime.now().strftime("%Y-%m-%d")
-    }
-
-    if Path(ARCHIVO_NOTICIAS).exists():
-        with open(ARCHIVO_NOTICIAS, "r", encoding="utf-8") as f:
-            try:
-                noticias = json.load(f)
-            except json.JSONDecodeError:
-                noticias = []
+    consultas = [query] if query else INGESTA.consultas
+    if pagina:
+        print(f"Buscando más resultados en Google (página {pagina + 1})")
     else:
-        noticias = []
-
-    noticias.append(noticia)
-
-    # Limita a los últimos 100 registros por si crece mucho
-    noticias = noticias[-100:]
-
-    with open(ARCHIVO_NOTICIAS, "w", encoding="utf-8") as f:
-        json.dump(noticias, f, ensure_ascii=False, indent=2)
+        print(f"Buscando noticias reales en Google ({len(consultas)} consultas) y en {len(INGESTA.fuentes)} feeds")
+    return INGESTA.obtener_sincrono(consultas, pagina)
 
 def generar_conceptos_visual_llm(texto: str) -> List[str]:
     prompt = (
@@ -166,8 +109,10 @@ def generar_conceptos_visual_llm(texto: str) -> List[str]:
         f"News text:\n\"\"\"\n{texto}\n\"\"\""
     )
     respuesta = modelo_llm(prompt)
-    conceptos_limpios = [c.strip() for c in respuesta.split(',') if c.strip()]
+    conceptos_limpios = [re.sub(r'^\d+[\.\)]\s*', '', c.strip()) for c in respuesta.split(',') if c.strip()]
+    return depurar_conceptos(conceptos_limpios)
 
+def depurar_conceptos(conceptos_limpios: List[str]) -> List[str]:
     correcciones = {
         "Gemini": "Google's AI model represented with holographic data",
         "Claude": "Anthropic's AI assistant in a digital interface",
@@ -182,116 +127,72 @@ def generar_conceptos_visual_llm(texto: str) -> List[str]:
     for c in conceptos_limpios:
         limpio = c.strip().strip('"')
         corregido = correcciones.get(limpio, limpio)
-        if corregido.lower() not in [k.lower() for k in MARCAS_PRIORITARIAS.keys()]:
+        if BUSCADOR_ENTIDADES.entidad_exacta(corregido, "marca") is None:
             conceptos_corregidos.append(corregido)
-    
-    conceptos_limpios = [re.sub(r'^\d+[\.\)]\s*', '', c.strip()) for c in respuesta.split(',') if c.strip()]
 
     return conceptos_corregidos[:4]
 
 def construir_prompt_final(conceptos: List[str], texto_original: str) -> str:
-    base = f"A cinematic digital painting of {', '.join(conceptos)}"
-
-    personas = {
-        "Sam Altman": "Sam Altman",
-        "Elon Musk": "Elon Musk",
-        "Sundar Pichai": "Sundar Pichai",
-        "Jensen Huang": "Jensen Huang",
-        "Mark Zuckerberg": "Mark Zuckerberg",
-        "Tim Cook": "Tim Cook"
-    }
-
-    texto_lower = texto_original.lower()
-    for nombre, desc in personas.items():
-        if nombre.lower() in texto_lower and all(nombre.lower() not in c.lower() for c in conceptos):
-            base += f", with a portrait of {desc}"
-            print(f"🧑‍🎨 Persona añadida al prompt: {desc}")
-            break
-
-    for nombre, decorado in MARCAS_PRIORITARIAS.items():
-        if nombre.lower() in texto_lower:
-            base += f", featuring {decorado}"
-            print(f"🏢 Decorado añadido al prompt: {decorado}")
-            break
-
-    return f"{base}, in the art style of a stylized, highly detailed, digital painting, no text, cinematic lighting"
-
-def generar_imagen_local(prompt: str) -> BytesIO:
-    global PIPE
+    # Cada trozo lleva una prioridad para poder recortar el prompt si no cabe en CLIP
+    segmentos = [Segmento(f"A cinematic digital painting of {', '.join(conceptos[:1])}", PRIORIDAD_FIJA)]
+    segmentos += [Segmento(c, 5 - i) for i, c in enumerate(conceptos[1:])]
+
+    encontradas = BUSCADOR_ENTIDADES.buscar(texto_original)
+    en_conceptos = set(BUSCADOR_ENTIDADES.entidades_en(", ".join(conceptos), "persona"))
+    personas = [c.entidad for c in encontradas if c.tipo == "persona" and c.entidad not in en_conceptos]
+    if personas:
+        segmentos.append(Segmento(f"with a portrait of {personas[0]}", 6))
+        print(f"🧑‍🎨 Persona añadida al prompt: {personas[0]}")
+
+    marcas = [c.entidad for c in encontradas if c.tipo == "marca"]
+    if marcas:
+        marca = min(marcas, key=ORDEN_MARCAS.get)
+        decorado = MARCAS_PRIORITARIAS[marca]
+        segmentos.append(Segmento(f"featuring {decorado}", 4, corto=f"featuring {marca} logo"))
+        print(f"🏢 Decorado añadido al prompt: {decorado}")
+
+    segmentos += [
+        Segmento("in the art style of a stylized, highly detailed, digital painting", 2, corto="digital painting"),
+        Segmento("no text", 7),
+        Segmento("cinematic lighting", 1),
+    ]
+    return ajustar_prompt(segmentos)
+
+ORQUESTADOR = OrquestadorNoticias(
+    TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_API_URL,
+    obtener_noticias=obtener_noticias_reales_google,
+    generar_conceptos=generar_conceptos_visual_llm,
+    depurar_conceptos=depurar_conceptos,
+    construir_prompt=construir_prompt_final,
+    # Ordena las candidatas por relevancia para el tema (con las marcas como términos del perfil)
+    puntuador=PuntuadorNoticias(terminos_extra=MARCAS_PRIORITARIAS),
+)
+enviar_noticia = ORQUESTADOR.enviar_noticia
+enviar_noticias_pipeline = ORQUESTADOR.enviar_noticias_pipeline
+
+def calentar_modelos():
+    """
+    Deja cargados el modelo de Ollama, los tokenizadores CLIP y, si no hay servidor de imágenes,
+    el pipeline de SDXL.
+    """
     try:
-        if PIPE is None:
-            modelo_id = "stabilityai/stable-diffusion-xl-base-1.0"
-            PIPE = StableDiffusionXLPipeline.from_pretrained(modelo_id, torch_dtype=torch.float16, variant="fp16")
-            PIPE.to("cuda" if torch.cuda.is_available() else "cpu")
-
-        image = PIPE(prompt=prompt, num_inference_steps=25, guidance_scale=6.0, height=512, width=896,
-            negative_prompt="text, watermark, blurry, deformed, duplicate, low quality").images[0]
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        return img_byte_arr
-    except Exception as e:
-        print(f"❌ Error generando imagen: {e}")
-        img = Image.new('RGB', (896, 512), color='gray')
-        d = ImageDraw.Draw(img)
-        d.text((10, 10), "Error generando imagen", fill=(255, 255, 255))
-        img_byte_arr = BytesIO()
-        img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        return img_byte_arr
-
-async def enviar_noticia():
-    print("🔍 Buscando noticia relevante en Google News...")
-    noticias = obtener_noticias_reales_google()
-    # Filtrar noticias ya publicadas
-    noticias = [n for n in noticias if not url_ya_publicada(n[3])]
-
-
-    if not noticias:
-        print("❌ No se encontró ninguna noticia.")
-        return
-
-    # Elegimos la primera noticia (puedes implementar lógica para evitar repetidas)
-    titulo_noticia, snippet, _, url_noticia = noticias[0]
-    texto = f"{titulo_noticia}. {snippet}"
-
-    with medir_duracion("generar resumen"):
-        resumen = modelo_llm(
-            "Resume en español esta noticia en tres partes separadas por nueva línea:\n"
-            "1. TÍTULO: (máximo 15 palabras, en español)\n"
-            "2. RESUMEN: (1–2 frases claras en español)\n"
-            "3. COMENTARIO: (análisis de impacto o contexto tambien en español)\n\n"
-            f"{texto}"
-        )
-    print("🧠 Resumen generado:\n", resumen)
-
-    with medir_duracion("extraer conceptos"):
-        conceptos = generar_conceptos_visual_llm(texto)
-    print("🔑 Conceptos visuales extraídos:", conceptos)
-
-    with medir_duracion("generar imagen"):
-        prompt = construir_prompt_final(conceptos, texto)
-        print("🎨 Prompt visual final:\n", prompt)
-        print("🧮 Tokens estimados para CLIP:", contar_tokens_estimada(prompt), "/ 77")
-        imagen = generar_imagen_local(prompt)
-
-    texto_telegram = (
-    f"{resumen}\n\n"
-    f"🗓 *Publicado:* {datetime.now().strftime('%d/%m/%Y %H:%M')}\n"
-    f"🔗 Fuente: {url_noticia}"
-    )   
-
-    with medir_duracion("enviar a Telegram"):
-        await bot.send_photo(
-            chat_id=TELEGRAM_CHAT_ID, 
-            photo=imagen, 
-            caption=texto_telegram, 
-            parse_mode="Markdown")
-
-    guardar_noticia_publicada(titulo_noticia, url_noticia)
+        obtener_cliente().precargar("mistral")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"⚠️ No se pudo precargar el modelo en Ollama: {e}")
+    obtener_tokenizadores()
+    if not servidor_en_marcha():
+        cargar_pipeline()
 
 
 if __name__ == "__main__":
     if os.name == "nt":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(enviar_noticia())
+    tarea = enviar_noticias_pipeline if "--todas" in sys.argv else enviar_noticia
+    if "--demonio" in sys.argv:
+        iniciar_servidor_metricas()
+        try:
+            asyncio.run(Demonio(tarea, calentar=calentar_modelos).ejecutar())
+        except KeyboardInterrupt:
+            print("👋 Demonio detenido")
+    else:
+        asyncio.run(tarea())
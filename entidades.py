@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import re
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# 🏷️ Búsqueda de marcas y personas en el texto con una sola expresión regular compilada.
+# Los alias se organizan en un trie para que el patrón escale a miles de entradas, y los
+# límites de palabra evitan falsos positivos como "Meta" en "metadata" o "Apple" en "pineapple".
+
+
+class Coincidencia(NamedTuple):
+    tipo: str
+    entidad: str
+    alias: str
+    inicio: int
+    fin: int
+
+
+def cargar_entidades(ruta: str) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Lee el fichero de entidades: {"tipo": {"Nombre canónico": ["alias", ...]}}.
+    Si no existe, devuelve un diccionario vacío.
+    """
+    if not Path(ruta).exists():
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _trie_a_regex(nodo: dict) -> str:
+    final = "" in nodo
+    alternativas = [re.escape(c) + _trie_a_regex(hijo) for c, hijo in sorted(nodo.items()) if c]
+    if not alternativas:
+        return ""
+    if len(alternativas) == 1 and not final:
+        return alternativas[0]
+    patron = "(?:" + "|".join(alternativas) + ")"
+    return patron + "?" if final else patron
+
+
+class BuscadorEntidades:
+    """
+    Se construye una vez con {"tipo": {"Nombre": [alias, ...]}} y devuelve, en una sola pasada,
+    todas las entidades que aparecen en un texto con su posición. Sin distinguir mayúsculas.
+    """
+
+    def __init__(self, entidades: Dict[str, Dict[str, Iterable[str]]]):
+        self._alias: Dict[str, Tuple[str, str]] = {}
+        for tipo, nombres in entidades.items():
+            for nombre, alias in nombres.items():
+                for a in [nombre, *alias]:
+                    self._alias.setdefault(a.lower(), (tipo, nombre))
+
+        trie: dict = {}
+        for alias in self._alias:
+            nodo = trie
+            for c in alias:
+                nodo = nodo.setdefault(c, {})
+            nodo[""] = {}
+        cuerpo = _trie_a_regex(trie) or "(?!)"
+        self._patron = re.compile(rf"(?<!\w)(?:{cuerpo})(?!\w)", re.IGNORECASE)
+
+    def buscar(self, texto: str, tipo: Optional[str] = None) -> List[Coincidencia]:
+        coincidencias = []
+        for m in self._patron.finditer(texto):
+            tipo_m, nombre = self._alias[m.group(0).lower()]
+            if tipo is None or tipo == tipo_m:
+                coincidencias.append(Coincidencia(tipo_m, nombre, m.group(0), m.start(), m.end()))
+        return coincidencias
+
+    def entidades_en(self, texto: str, tipo: Optional[str] = None) -> List[str]:
+        """
+        Nombres canónicos encontrados, sin repetir y en orden de aparición.
+        """
+        return list(dict.fromkeys(c.entidad for c in self.buscar(texto, tipo)))
+
+    def entidad_exacta(self, texto: str, tipo: Optional[str] = None) -> Optional[str]:
+        """
+        Nombre canónico si el texto completo es una entidad o uno de sus alias.
+        """
+        encontrado = self._alias.get(texto.strip().lower())
+        if encontrado is None or (tipo is not None and encontrado[0] != tipo):
+            return None
+        return encontrado[1]
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import random
+import platform
+from typing import Dict, List, Optional
+from codificacion_imagen import codificar_imagen
+from metricas import METRICAS
+from perfiles_sdxl import PASOS_CALIBRACION, PERFILES, PERFILES_LCM, CalibracionSDXL, Perfil
+
+# 🎨 Generación de imágenes con SDXL (compartido por los scripts y el servidor de imágenes).
+# torch y diffusers tardan segundos en importarse: solo se importan cuando hace falta una imagen.
+MODELO_ID = "stabilityai/stable-diffusion-xl-base-1.0"
+NEGATIVE_PROMPT = "text, watermark, blurry, deformed, duplicate, low quality"
+ANCHO = 896
+ALTO = 512
+
+# Memoria de GPU aproximada que consume cada imagen de un lote a 896x512 en fp16
+MEMORIA_POR_IMAGEN_MB = int(os.getenv("MEMORIA_POR_IMAGEN_MB", "1500"))
+MAX_TAM_LOTE = int(os.getenv("MAX_TAM_LOTE", "4"))
+
+PASOS = 25
+GUIDANCE = 6.0
+
+# 🖥️ Sin GPU: fp16 en CPU es lentísimo (o no está soportado), así que se carga en float32, o en
+# bfloat16 si la CPU lo acelera (AVX512-BF16/AMX). "auto", "float32" o "bfloat16"
+DTYPE_CPU = os.getenv("SDXL_DTYPE_CPU", "auto")
+# Hilos de torch en CPU; 0 = los núcleos disponibles para el proceso (respeta límites del contenedor)
+HILOS_CPU = int(os.getenv("SDXL_HILOS_CPU", "0"))
+# LoRA destilada de pocos pasos (p. ej. latent-consistency/lcm-lora-sdxl) con el scheduler LCM
+LORA_CPU = os.getenv("SDXL_LORA_CPU")
+PASOS_LORA = int(os.getenv("SDXL_PASOS_LORA", "6"))
+GUIDANCE_LORA = float(os.getenv("SDXL_GUIDANCE_LORA", "1.5"))
+LORA_ACTIVA = False
+
+# ⏲️ Segundos por imagen (p. ej. 20): elige perfil según la calibración (ver perfiles_sdxl).
+# 0 = sin presupuesto, con los pasos y la resolución fijos de arriba
+PRESUPUESTO_S = float(os.getenv("SDXL_PRESUPUESTO_S", "0")) or None
+CLASES_SCHEDULER = {
+    "euler": "EulerDiscreteScheduler",
+    "dpmpp": "DPMSolverMultistepScheduler",
+    "lcm": "LCMScheduler",
+}
+
+PIPE = None
+_schedulers: Dict[str, object] = {}
+_calibracion: Optional[CalibracionSDXL] = None
+
+
+def _cpu_soporta_bf16() -> bool:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def _hilos_cpu() -> int:
+    if HILOS_CPU > 0:
+        return HILOS_CPU
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _preparar_cpu(pipe):
+    """
+    Ajustes para inferencia en CPU: channels_last en la UNet y el VAE, attention slicing (menos
+    memoria de pico), hilos de torch y, si está configurada, la LoRA de pocos pasos con LCM.
+    """
+    global PASOS, GUIDANCE, LORA_ACTIVA
+    import torch
+    torch.set_num_threads(_hilos_cpu())
+    pipe.unet.to(memory_format=torch.channels_last)
+    pipe.vae.to(memory_format=torch.channels_last)
+    pipe.enable_attention_slicing()
+    if LORA_CPU:
+        from diffusers import LCMScheduler
+        pipe.load_lora_weights(LORA_CPU)
+        pipe.fuse_lora()
+        pipe.scheduler = LCMScheduler.from_config(pipe.scheduler.config)
+        PASOS, GUIDANCE = PASOS_LORA, GUIDANCE_LORA
+        LORA_ACTIVA = True
+    print(f"🖥️ SDXL en CPU: {pipe.unet.dtype}, {torch.get_num_threads()} hilos, "
+          f"{PASOS} pasos{' con ' + LORA_CPU if LORA_CPU else ''}")
+
+
+def cargar_pipeline():
+    """
+    Carga el pipeline de SDXL una sola vez por proceso y lo reutiliza en llamadas posteriores.
+    Con GPU va en fp16; sin ella se elige el modo CPU automáticamente.
+    """
+    global PIPE
+    if PIPE is None:
+        import torch
+        from diffusers import StableDiffusionXLPipeline
+        if torch.cuda.is_available():
+            PIPE = StableDiffusionXLPipeline.from_pretrained(MODELO_ID, torch_dtype=torch.float16, variant="fp16")
+            PIPE.to("cuda")
+        else:
+            usar_bf16 = DTYPE_CPU == "bfloat16" or (DTYPE_CPU == "auto" and _cpu_soporta_bf16())
+            # Los pesos fp16 se descargan igual y se convierten al cargar
+            PIPE = StableDiffusionXLPipeline.from_pretrained(
+                MODELO_ID, torch_dtype=torch.bfloat16 if usar_bf16 else torch.float32, variant="fp16")
+            PIPE.to("cpu")
+            _preparar_cpu(PIPE)
+    return PIPE
+
+
+def _tam_lote_automatico() -> int:
+    """
+    Calcula cuántas imágenes caben en un lote según la memoria libre de la GPU.
+    """
+    import torch
+    if not torch.cuda.is_available():
+        return 1
+    libre, _ = torch.cuda.mem_get_info()
+    return max(1, min(MAX_TAM_LOTE, libre // (MEMORIA_POR_IMAGEN_MB * 1024 * 1024)))
+
+
+def _scheduler(pipe, nombre: str):
+    """
+    Una instancia por tipo de scheduler, creada a partir de la configuración del original.
+    """
+    if not _schedulers:
+        _schedulers["original"] = pipe.scheduler
+    if nombre not in _schedulers:
+        import diffusers
+        clase = getattr(diffusers, CLASES_SCHEDULER[nombre])
+        _schedulers[nombre] = clase.from_config(_schedulers["original"].config)
+    return _schedulers[nombre]
+
+
+def _huella(pipe) -> str:
+    import torch
+    if pipe.device.type == "cuda":
+        dispositivo = torch.cuda.get_device_name(pipe.device)
+    else:
+        dispositivo = f"{platform.processor() or platform.machine()} ({torch.get_num_threads()} hilos)"
+    return f"{dispositivo} | {pipe.unet.dtype} | torch {torch.__version__} | lora {LORA_CPU if LORA_ACTIVA else '-'}"
+
+
+def _generar_perfil(pipe, perfil: Perfil, pasos: int, prompt: str, semilla: int):
+    """
+    Genera una imagen con el perfil dado y mide el tiempo total y el de cada paso de difusión
+    (mediana de los intervalos entre pasos, que excluye la codificación del texto y el VAE).
+    """
+    import torch
+    marcas = []
+
+    def al_terminar_paso(pipe, paso, timestep, argumentos):
+        if pipe.device.type == "cuda":
+            torch.cuda.synchronize()
+        marcas.append(time.perf_counter())
+        return argumentos
+
+    pipe.scheduler = _scheduler(pipe, perfil.scheduler)
+    try:
+        inicio = time.perf_counter()
+        image = pipe(prompt=prompt, negative_prompt=NEGATIVE_PROMPT, num_inference_steps=pasos,
+                     guidance_scale=GUIDANCE, height=perfil.alto, width=perfil.ancho,
+                     generator=torch.Generator(device=pipe.device).manual_seed(semilla),
+                     callback_on_step_end=al_terminar_paso).images[0]
+        total = time.perf_counter() - inicio
+    finally:
+        pipe.scheduler = _schedulers["original"]
+    intervalos = sorted(b - a for a, b in zip(marcas, marcas[1:]))
+    paso_s = intervalos[len(intervalos) // 2] if intervalos else total / pasos
+    return image, total, paso_s
+
+
+def calibrar_equipo(forzar: bool = False) -> CalibracionSDXL:
+    """
+    Mide cada resolución de la tabla de perfiles con PASOS_CALIBRACION pasos (unos segundos en GPU,
+    bastante más en CPU) y lo guarda en disco. Solo mide lo que falte, salvo con `forzar`.
+    """
+    global _calibracion
+    pipe = cargar_pipeline()
+    if _calibracion is None:
+        _calibracion = CalibracionSDXL(_huella(pipe))
+    if forzar:
+        _calibracion.resoluciones = {}
+    perfiles = PERFILES_LCM if LORA_ACTIVA else PERFILES
+    pendientes = _calibracion.pendientes(perfiles)
+    if pendientes:
+        print(f"⏲️ Calibrando SDXL en este equipo ({len(pendientes)} resoluciones)...")
+        # Calentamiento: la primera pasada incluye costes únicos (kernels, cachés)
+        _generar_perfil(pipe, pendientes[0], 1, "calibration", 0)
+        for perfil in pendientes:
+            tiempos = tuple(_generar_perfil(pipe, perfil, n, "calibration", 0)[1] for n in PASOS_CALIBRACION)
+            _calibracion.calibrar(perfil, tiempos)
+            coste = _calibracion.resoluciones[perfil.resolucion]
+            print(f"   {perfil.resolucion}: {coste['fijo_s']:.2f} s fijos + {coste['paso_s']:.3f} s por paso")
+        _calibracion.guardar()
+    return _calibracion
+
+
+def _generar_con_presupuesto(pipe, prompt: str, semilla: int, presupuesto_s: float):
+    calibracion = calibrar_equipo()
+    perfil, pasos = calibracion.elegir(presupuesto_s, PERFILES_LCM if LORA_ACTIVA else PERFILES)
+    estimado = calibracion.estimar(perfil, pasos)
+    image, total, paso_s = _generar_perfil(pipe, perfil, pasos, prompt, semilla)
+    print(f"⏲️ Presupuesto {presupuesto_s:.0f} s → perfil {perfil.nombre} ({perfil.scheduler}, {pasos} pasos, "
+          f"{perfil.resolucion}): estimado {estimado:.1f} s, real {total:.1f} s")
+    if total > presupuesto_s:
+        print(f"⚠️ Presupuesto superado en {total - presupuesto_s:.1f} s; las próximas imágenes usarán menos pasos")
+    calibracion.registrar(perfil, pasos, total, paso_s)
+    METRICAS.observar("noticiasbot_imagen_segundos", total, dispositivo=pipe.device.type)
+    return image
+
+
+def generar_imagenes_lote(prompts: List[str], semillas: Optional[List[Optional[int]]] = None,
+                          tam_lote: Optional[int] = None, presupuesto_s: Optional[float] = PRESUPUESTO_S) -> List[bytes]:
+    """
+    Genera una imagen codificada (ver codificacion_imagen) por prompt, pasando los prompts por el pipeline en lotes.
+    Cada prompt puede llevar su semilla; sin semilla se usa una aleatoria. Con `presupuesto_s`,
+    las imágenes se generan de una en una con el perfil que quepa en ese tiempo.
+    """
+    if not prompts:
+        return []
+    if semillas is None:
+        semillas = [None] * len(prompts)
+    if len(semillas) != len(prompts):
+        raise ValueError("Debe haber una semilla (o None) por cada prompt")
+    semillas = [s if s is not None else random.randrange(2**32) for s in semillas]
+
+    import torch
+    pipe = cargar_pipeline()
+    if presupuesto_s:
+        return [codificar_imagen(_generar_con_presupuesto(pipe, prompt, semilla, presupuesto_s)).datos
+                for prompt, semilla in zip(prompts, semillas)]
+    tam = tam_lote or _tam_lote_automatico()
+    resultados = []
+    i = 0
+    while i < len(prompts):
+        trozo = prompts[i:i + tam]
+        generadores = [torch.Generator(device=pipe.device).manual_seed(s) for s in semillas[i:i + tam]]
+        inicio = time.perf_counter()
+        try:
+            images = pipe(prompt=trozo, num_inference_steps=PASOS, guidance_scale=GUIDANCE, height=ALTO, width=ANCHO,
+                negative_prompt=[NEGATIVE_PROMPT] * len(trozo), generator=generadores).images
+        except torch.cuda.OutOfMemoryError:
+            if tam == 1:
+                raise
+            # El lote no cabe: vaciamos la caché y reintentamos con la mitad
+            torch.cuda.empty_cache()
+            tam = max(1, tam // 2)
+            print(f"⚠️ Memoria de GPU insuficiente, reduciendo el lote a {tam}")
+            continue
+        por_imagen = (time.perf_counter() - inicio) / len(trozo)
+        print(f"🖼️ {len(trozo)} imagen(es) en {pipe.device.type}: {por_imagen:.1f} s por imagen")
+        METRICAS.observar("noticiasbot_imagen_segundos", por_imagen, dispositivo=pipe.device.type)
+        resultados.extend(codificar_imagen(image).datos for image in images)
+        i += len(trozo)
+    return resultados
+
+
+
+if __name__ == "__main__":
+    if "--calibrar" not in sys.argv:
+        print("Uso: python imagen_sdxl.py --calibrar")
+        sys.exit(1)
+    calibracion = calibrar_equipo(forzar=True)
+    for perfil in PERFILES_LCM if LORA_ACTIVA else PERFILES:
+        print(f"   {perfil.nombre:12} {perfil.scheduler:6} {perfil.pasos:3} pasos {perfil.resolucion:>8}: "
+              f"~{calibracion.estimar(perfil):.1f} s")
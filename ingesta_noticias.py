@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import html
+import asyncio
+import threading
+import requests
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from almacen_noticias import canonizar_url
+from cache_busqueda import obtener_cache_busqueda
+from metricas import METRICAS
+
+# 📡 Ingesta de candidatas: varias consultas de Custom Search y feeds RSS/Atom en paralelo, con un
+# límite de peticiones simultáneas por host. Los feeds se piden con If-None-Match/If-Modified-Since:
+# si no han cambiado responden 304 y se reutilizan las entradas ya parseadas. El resultado es una
+# sola lista (titulo, snippet, fecha, url) sin URLs repetidas; el tiempo total es el de la fuente más lenta.
+CONSULTAS_BUSQUEDA = [c.strip() for c in os.getenv("CONSULTAS_BUSQUEDA", "latest AI agent news").split("|") if c.strip()]
+FUENTES_RSS = [u.strip() for u in os.getenv("FUENTES_RSS", "").split(",") if u.strip()]
+MAX_POR_HOST = int(os.getenv("INGESTA_MAX_POR_HOST", "2"))
+TIMEOUT = float(os.getenv("INGESTA_TIMEOUT", "10"))
+ARCHIVO_CACHE_FUENTES = os.getenv("INGESTA_CACHE_FUENTES", "cache_fuentes.json")
+# Entradas que se toman de cada feed (los más recientes van primero)
+MAX_ENTRADAS_FEED = 20
+# Custom Search da como mucho 10 resultados por petición; las páginas siguientes (start=11, 21...)
+# solo se piden cuando las de antes no dejan ninguna candidata válida
+RESULTADOS_POR_PAGINA = 10
+MAX_PAGINAS = int(os.getenv("BUSQUEDA_MAX_PAGINAS", "3"))
+# Hilos propios para las peticiones: el ejecutor por defecto de asyncio tiene cpu+4 hilos y con
+# pocos núcleos pondría en fila fuentes que deberían ir a la vez
+MAX_HILOS = 16
+
+Noticia = Tuple[str, str, datetime, str]
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+
+
+def _texto_plano(fragmento: Optional[str]) -> str:
+    """
+    Quita etiquetas y entidades HTML de los resúmenes de los feeds.
+    """
+    if not fragmento:
+        return ""
+    return " ".join(html.unescape(re.sub(r"<[^>]+>", " ", fragmento)).split())
+
+
+def _fecha(valor: Optional[str]) -> datetime:
+    """
+    pubDate (RFC 822) o updated/published (ISO 8601), en hora local sin zona. Si no se entiende, ahora.
+    """
+    if valor:
+        valor = valor.strip()
+        for convertir in (parsedate_to_datetime, lambda v: datetime.fromisoformat(v.replace("Z", "+00:00"))):
+            try:
+                fecha = convertir(valor)
+            except (TypeError, ValueError):
+                continue
+            return fecha.astimezone().replace(tzinfo=None) if fecha.tzinfo else fecha
+    return datetime.now()
+
+
+def parsear_feed(contenido: bytes) -> List[Noticia]:
+    """
+    Entradas de un feed RSS 2.0 o Atom.
+    """
+    raiz = ET.fromstring(contenido)
+    noticias = []
+    for item in raiz.iter("item"):
+        noticias.append((
+            _texto_plano(item.findtext("title")),
+            _texto_plano(item.findtext("description")),
+            _fecha(item.findtext("pubDate")),
+            (item.findtext("link") or "").strip(),
+        ))
+    for entrada in raiz.iter(f"{_ATOM}entry"):
+        enlace = entrada.find(f"{_ATOM}link[@rel='alternate']")
+        if enlace is None:
+            enlace = entrada.find(f"{_ATOM}link")
+        noticias.append((
+            _texto_plano(entrada.findtext(f"{_ATOM}title")),
+            _texto_plano(entrada.findtext(f"{_ATOM}summary") or entrada.findtext(f"{_ATOM}content")),
+            _fecha(entrada.findtext(f"{_ATOM}updated") or entrada.findtext(f"{_ATOM}published")),
+            (enlace.get("href", "") if enlace is not None else "").strip(),
+        ))
+    noticias = [n for n in noticias if n[0] and n[3]]
+    noticias.sort(key=lambda n: n[2], reverse=True)
+    return noticias[:MAX_ENTRADAS_FEED]
+
+
+class IngestaNoticias:
+    """
+    Reúne las candidatas de todas las fuentes. `obtener` es asíncrona; las peticiones HTTP van a
+    hilos (requests) y un semáforo por host evita abrir demasiadas conexiones contra el mismo servidor.
+    Los validadores (ETag, Last-Modified) y las entradas de cada feed se guardan en `ruta_cache`.
+    """
+
+    def __init__(self, url_busqueda: str, api_key: Optional[str], cx: Optional[str],
+                 consultas: Sequence[str] = CONSULTAS_BUSQUEDA, fuentes: Sequence[str] = FUENTES_RSS,
+                 max_por_host: int = MAX_POR_HOST, ruta_cache: str = ARCHIVO_CACHE_FUENTES):
+        self.url_busqueda = url_busqueda
+        self.api_key = api_key
+        self.cx = cx
+        self.consultas = list(consultas)
+        self.fuentes = list(fuentes)
+        self.max_por_host = max_por_host
+        self.ruta_cache = ruta_cache
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_maxsize=MAX_HILOS)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+        self._hilos = ThreadPoolExecutor(max_workers=MAX_HILOS, thread_name_prefix="ingesta")
+        self._lock = threading.Lock()
+        # Última página con resultados de cada consulta (la API no anunció una siguiente)
+        self._ultima_pagina: Dict[str, int] = {}
+        self._cache: Dict[str, dict] = {}
+        try:
+            with open(ruta_cache, "r", encoding="utf-8") as f:
+                self._cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    @property
+    def busqueda_configurada(self) -> bool:
+        return bool(self.api_key and self.cx)
+
+    def _guardar_cache(self):
+        temporal = f"{self.ruta_cache}.tmp"
+        with self._lock:
+            datos = json.dumps(self._cache, ensure_ascii=False)
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(datos)
+        os.replace(temporal, self.ruta_cache)
+
+    def buscar(self, consulta: str, pagina: int = 0) -> List[Noticia]:
+        """
+        Una página de una consulta a Custom Search (síncrona; se llama desde un hilo). Una respuesta
+        vigente en la caché no gasta cuota; sin cuota, o si la API falla, se usa la última guardada.
+        """
+        if pagina > self._ultima_pagina.get(consulta, MAX_PAGINAS):
+            return []
+        parametros = {"key": self.api_key, "cx": self.cx, "q": consulta, "num": RESULTADOS_POR_PAGINA,
+                      "start": 1 + pagina * RESULTADOS_POR_PAGINA, "dateRestrict": "d1", "lr": "lang_en"}
+        cache = obtener_cache_busqueda()
+        datos, resultado = None, "ok"
+        if cache is not None:
+            guardada = cache.obtener(parametros)
+            if guardada is not None:
+                datos, resultado = guardada[0], "cache"
+                print(f"🔎 '{consulta}' (página {pagina + 1}) desde la caché ({guardada[1] / 60:.0f} min)")
+            elif not cache.reservar_consulta():
+                guardada = cache.obtener(parametros, caducadas=True)
+                print(f"⚠️ Cuota de búsqueda agotada por hoy ({cache.usadas_hoy()} consultas): "
+                      f"{'se usan los resultados guardados' if guardada else 'sin resultados guardados'} para '{consulta}'")
+                if guardada is None:
+                    METRICAS.incrementar("noticiasbot_fuentes_total", tipo="busqueda", resultado="sin_cuota")
+                    return []
+                datos, resultado = guardada[0], "cache_caducada"
+        if datos is None:
+            try:
+                response = self.sesion.get(self.url_busqueda, params=parametros, timeout=TIMEOUT)
+                response.raise_for_status()
+                datos = response.json()
+            except (requests.exceptions.RequestException, ValueError):
+                guardada = cache.obtener(parametros, caducadas=True) if cache is not None else None
+                if guardada is None:
+                    raise
+                print(f"⚠️ Falló la búsqueda '{consulta}': se usan los resultados guardados")
+                datos, resultado = guardada[0], "cache_caducada"
+            else:
+                if cache is not None:
+                    cache.guardar(parametros, datos)
+        METRICAS.incrementar("noticiasbot_fuentes_total", tipo="busqueda", resultado=resultado)
+
+        if "nextPage" not in datos.get("queries", {}):
+            self._ultima_pagina[consulta] = pagina
+        ahora = datetime.now()
+        return [(item.get("title", ""), item.get("snippet", ""), ahora, item.get("link", ""))
+                for item in datos.get("items", [])]
+
+    def leer_feed(self, url: str) -> List[Noticia]:
+        """
+        Petición condicional: con 304 se devuelven las entradas guardadas sin volver a parsear.
+        """
+        with self._lock:
+            guardado = self._cache.get(url)
+        cabeceras = {}
+        if guardado:
+            if guardado.get("etag"):
+                cabeceras["If-None-Match"] = guardado["etag"]
+            if guardado.get("last_modified"):
+                cabeceras["If-Modified-Since"] = guardado["last_modified"]
+        response = self.sesion.get(url, headers=cabeceras, timeout=TIMEOUT)
+        if response.status_code == 304 and guardado:
+            METRICAS.incrementar("noticiasbot_fuentes_total", tipo="feed", resultado="no_modificado")
+            return [(t, s, datetime.fromisoformat(f), u) for t, s, f, u in guardado["entradas"]]
+        response.raise_for_status()
+        noticias = parsear_feed(response.content)
+        with self._lock:
+            self._cache[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "entradas": [(t, s, f.isoformat(), u) for t, s, f, u in noticias],
+            }
+        METRICAS.incrementar("noticiasbot_fuentes_total", tipo="feed", resultado="ok")
+        return noticias
+
+    async def _pedir(self, semaforos: Dict[str, asyncio.Semaphore], url: str, tipo: str, funcion, *argumentos) -> List[Noticia]:
+        host = urlsplit(url).netloc
+        semaforo = semaforos.setdefault(host, asyncio.Semaphore(self.max_por_host))
+        async with semaforo:
+            try:
+                noticias = await asyncio.get_running_loop().run_in_executor(self._hilos, funcion, *argumentos)
+            except (requests.exceptions.RequestException, ValueError, ET.ParseError) as e:
+                print(f"❌ Error en la fuente {argumentos[0]}: {e}")
+                METRICAS.incrementar("noticiasbot_fuentes_total", tipo=tipo, resultado="error")
+                return []
+        return noticias
+
+    async def obtener(self, consultas: Optional[Sequence[str]] = None, pagina: int = 0) -> List[Noticia]:
+        """
+        Todas las fuentes a la vez. Se mantiene el orden de las fuentes (primero las consultas) y,
+        si una URL llega por varias, cuenta la primera. Con `pagina` > 0 solo se piden las
+        páginas siguientes de las consultas (los feeds no tienen más).
+        """
+        consultas = self.consultas if consultas is None else consultas
+        if not self.busqueda_configurada:
+            consultas = []
+        semaforos: Dict[str, asyncio.Semaphore] = {}
+        fuentes = self.fuentes if pagina == 0 else []
+        tareas = [self._pedir(semaforos, self.url_busqueda, "busqueda", self.buscar, c, pagina) for c in consultas]
+        tareas += [self._pedir(semaforos, url, "feed", self.leer_feed, url) for url in fuentes]
+        resultados = await asyncio.gather(*tareas)
+        if fuentes:
+            self._guardar_cache()
+
+        vistas = set()
+        noticias = []
+        for noticia in (n for lista in resultados for n in lista):
+            clave = canonizar_url(noticia[3])
+            if clave not in vistas:
+                vistas.add(clave)
+                noticias.append(noticia)
+        print(f"📡 {len(noticias)} candidatas de {len(tareas)} fuentes")
+        return noticias
+
+    def obtener_sincrono(self, consultas: Optional[Sequence[str]] = None, pagina: int = 0) -> List[Noticia]:
+        """
+        Para llamarla fuera de un bucle de eventos (p. ej. desde asyncio.to_thread).
+        """
+        return asyncio.run(self.obtener(consultas, pagina))
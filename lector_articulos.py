@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import time
+import codecs
+import sqlite3
+import threading
+import requests
+from html.parser import HTMLParser
+from typing import List, Optional
+from almacen_noticias import canonizar_url
+from metricas import METRICAS
+
+# 📄 Texto completo de los artículos (opcional): el snippet de la búsqueda suele cortarse a media
+# frase. Se descarga la página en streaming, se extraen los párrafos sobre la marcha y se deja de
+# leer en cuanto hay texto suficiente o se llega al tope de bytes. Lo extraído se guarda en disco
+# por URL canónica y, antes de llegar al LLM, se recorta a un presupuesto de tokens.
+ACTIVO = os.getenv("ARTICULOS_COMPLETOS", "0") == "1"
+MAX_BYTES = int(float(os.getenv("ARTICULOS_MAX_KB", "1024")) * 1024)
+TOKENS_MAX = int(os.getenv("ARTICULOS_TOKENS", "500"))
+CONCURRENCIA = int(os.getenv("ARTICULOS_CONCURRENCIA", "4"))
+TIMEOUT = (3.05, float(os.getenv("ARTICULOS_TIMEOUT", "8")))
+RUTA_CACHE = os.getenv("ARTICULOS_CACHE_RUTA", "cache_articulos.sqlite3")
+TTL_DIAS = 7
+TAMANO_BLOQUE = 16 * 1024
+# Se deja de leer con este múltiplo del presupuesto: el recorte final busca frases enteras
+MARGEN_TEXTO = 1.5
+# Caracteres por token (aproximado para modelos tipo Mistral/Llama en inglés)
+CARACTERES_POR_TOKEN = 4
+# Párrafos más cortos suelen ser pies de foto, firmas o botones
+MIN_CARACTERES_PARRAFO = 60
+CABECERAS = {"User-Agent": "Mozilla/5.0 (compatible; NoticiasBot/1.0)", "Accept": "text/html"}
+
+
+def estimar_tokens(texto: str) -> int:
+    return (len(texto) + CARACTERES_POR_TOKEN - 1) // CARACTERES_POR_TOKEN
+
+
+def recortar_a_tokens(texto: str, max_tokens: int) -> str:
+    """
+    Frases enteras hasta el presupuesto; si la primera ya no cabe, se corta por palabras.
+    """
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+    limite = max_tokens * CARACTERES_POR_TOKEN
+    frases = re.split(r"(?<=[.!?])\s+", texto)
+    recortado = ""
+    for frase in frases:
+        candidato = f"{recortado} {frase}".strip()
+        if len(candidato) > limite:
+            break
+        recortado = candidato
+    return recortado or texto[:limite].rsplit(" ", 1)[0]
+
+
+class _ExtractorTexto(HTMLParser):
+    """
+    Se alimenta por trozos y va juntando el texto de párrafos, titulares y listas, saltándose
+    scripts, menús, cabeceras y pies.
+    """
+    IGNORAR = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg",
+               "figure", "button", "iframe", "template", "select"}
+    BLOQUES = {"p", "h2", "h3", "li", "blockquote"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._ignorar = 0
+        self._en_bloque = False
+        self._actual: List[str] = []
+        self.parrafos: List[str] = []
+        self.caracteres = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.IGNORAR:
+            self._ignorar += 1
+        elif tag in self.BLOQUES:
+            self.cerrar_parrafo()
+            self._en_bloque = True
+
+    def handle_endtag(self, tag):
+        if tag in self.IGNORAR:
+            self._ignorar = max(0, self._ignorar - 1)
+        elif tag in self.BLOQUES:
+            self.cerrar_parrafo()
+            self._en_bloque = False
+
+    def handle_data(self, data):
+        if self._en_bloque and not self._ignorar:
+            self._actual.append(data)
+
+    def cerrar_parrafo(self):
+        texto = " ".join("".join(self._actual).split())
+        self._actual = []
+        if len(texto) >= MIN_CARACTERES_PARRAFO:
+            self.parrafos.append(texto)
+            self.caracteres += len(texto) + 1
+
+
+class LectorArticulos:
+    """
+    Descarga y extrae el texto de los artículos. Como mucho `concurrencia` descargas a la vez en
+    todo el proceso (se llama desde hilos: el paso de lectura del pipeline tiene varios trabajadores).
+    """
+
+    def __init__(self, ruta: str = RUTA_CACHE, max_bytes: int = MAX_BYTES, tokens_max: int = TOKENS_MAX,
+                 concurrencia: int = CONCURRENCIA):
+        self.max_bytes = max_bytes
+        self.tokens_max = tokens_max
+        self.sesion = requests.Session()
+        self.sesion.headers.update(CABECERAS)
+        self._semaforo = threading.BoundedSemaphore(concurrencia)
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=10, check_same_thread=False)
+        with self._conexion:
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS articulos (clave TEXT PRIMARY KEY, texto TEXT NOT NULL, creado REAL NOT NULL)"
+            )
+
+    def _descargar(self, url: str) -> str:
+        objetivo = self.tokens_max * CARACTERES_POR_TOKEN * MARGEN_TEXTO
+        with self._semaforo, self.sesion.get(url, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            tipo = response.headers.get("Content-Type", "").lower()
+            if "html" not in tipo:
+                return ""
+            # Sin charset en la cabecera requests supone ISO-8859-1; casi todo es UTF-8
+            codificacion = response.encoding if "charset" in tipo else "utf-8"
+            try:
+                decodificador = codecs.getincrementaldecoder(codificacion)(errors="replace")
+            except LookupError:
+                decodificador = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            extractor = _ExtractorTexto()
+            leidos = 0
+            for bloque in response.iter_content(TAMANO_BLOQUE):
+                leidos += len(bloque)
+                extractor.feed(decodificador.decode(bloque))
+                if extractor.caracteres >= objetivo or leidos >= self.max_bytes:
+                    break
+        extractor.cerrar_parrafo()
+        METRICAS.incrementar("noticiasbot_articulo_bytes_total", leidos)
+        return "\n".join(extractor.parrafos)
+
+    def leer(self, url: str) -> str:
+        """
+        Texto extraído del artículo ("" si no se pudo). Primero se busca en la caché.
+        """
+        clave = canonizar_url(url)
+        ahora = time.time()
+        with self._lock:
+            fila = self._conexion.execute("SELECT texto, creado FROM articulos WHERE clave = ?", (clave,)).fetchone()
+        if fila is not None and ahora - fila[1] <= TTL_DIAS * 86400:
+            METRICAS.incrementar("noticiasbot_articulos_total", resultado="cache")
+            return fila[0]
+        inicio = time.perf_counter()
+        try:
+            texto = self._descargar(url)
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️ No se pudo leer el artículo {url}: {e}")
+            METRICAS.incrementar("noticiasbot_articulos_total", resultado="error")
+            return ""
+        print(f"📄 Artículo leído en {time.perf_counter() - inicio:.2f} s ({len(texto)} caracteres): {url}")
+        METRICAS.incrementar("noticiasbot_articulos_total", resultado="descargado" if texto else "sin_texto")
+        with self._lock, self._conexion:
+            self._conexion.execute("INSERT OR REPLACE INTO articulos VALUES (?, ?, ?)", (clave, texto, ahora))
+            self._conexion.execute("DELETE FROM articulos WHERE creado < ?", (ahora - TTL_DIAS * 86400,))
+        return texto
+
+    def texto_para_llm(self, titulo: str, snippet: str, url: str) -> str:
+        """
+        Título y cuerpo recortado al presupuesto de tokens; si el cuerpo no aporta más que el
+        snippet, título y snippet como siempre.
+        """
+        cuerpo = recortar_a_tokens(self.leer(url), self.tokens_max)
+        if len(cuerpo) <= len(snippet):
+            return f"{titulo}. {snippet}"
+        return f"{titulo}. {cuerpo}"
+
+
+_lector: Optional[LectorArticulos] = None
+_lock_lector = threading.Lock()
+
+
+def obtener_lector_articulos() -> Optional[LectorArticulos]:
+    """
+    Lector único por proceso, o None si no está activado (ARTICULOS_COMPLETOS=1).
+    """
+    global _lector
+    if not ACTIVO:
+        return None
+    with _lock_lector:
+        if _lector is None:
+            _lector = LectorArticulos()
+        return _lector
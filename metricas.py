@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    # Windows: sin getrusage no hay pico de RSS
+    resource = None
+
+# 📈 Métricas por etapa: histogramas de duración y contadores, exportables en formato Prometheus
+# (endpoint HTTP o fichero para el textfile collector de node_exporter) y una línea JSON por ejecución.
+# Registrar una observación es un bisect y una suma bajo un lock: coste despreciable.
+LIMITES_SEGUNDOS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120, 300, 600)
+ARCHIVO_TEXTFILE = os.getenv("METRICAS_TEXTFILE")
+PUERTO_METRICAS = os.getenv("METRICAS_PUERTO")
+# Se importa al principio de los scripts: sirve de referencia para medir el arranque
+INICIO_PROCESO = time.perf_counter()
+_arranque_s: Optional[float] = None
+
+AYUDA = {
+    "noticiasbot_etapa_segundos": "Duración de cada etapa de la publicación",
+    "noticiasbot_llm_segundos": "Duración de las llamadas HTTP a Ollama",
+    "noticiasbot_llm_llamadas_total": "Llamadas a Ollama completadas",
+    "noticiasbot_llm_errores_total": "Llamadas a Ollama fallidas",
+    "noticiasbot_cache_llm_aciertos_total": "Respuestas servidas desde la caché del LLM",
+    "noticiasbot_cache_llm_fallos_total": "Consultas a la caché del LLM sin respuesta guardada",
+    "noticiasbot_fuentes_total": "Peticiones a fuentes de noticias (búsqueda o feed) por resultado",
+    "noticiasbot_articulos_total": "Artículos completos leídos por resultado (caché, descargado, sin texto o error)",
+    "noticiasbot_articulo_bytes_total": "Bytes descargados de páginas de artículos",
+    "noticiasbot_candidatas_descartadas_total": "Candidatas descartadas antes del LLM por ser portadas, listados o poco relevantes",
+    "noticiasbot_casi_duplicadas_total": "Candidatas descartadas por ser casi iguales a una noticia reciente",
+    "noticiasbot_chat_espera_segundos": "Segundos en cola del chat hasta tener hueco en el modelo",
+    "noticiasbot_chat_servicio_segundos": "Segundos de respuesta del chat una vez con hueco",
+    "noticiasbot_chat_rechazos_total": "Mensajes del chat rechazados por cola llena (por usuario o global)",
+    "noticiasbot_imagenes_generadas_total": "Imágenes obtenidas por origen (servidor, local o respaldo)",
+    "noticiasbot_imagen_segundos": "Segundos de difusión por imagen",
+    "noticiasbot_imagen_bytes_total": "Bytes de imagen codificados para Telegram",
+    "noticiasbot_publicaciones_total": "Publicaciones confirmadas por Telegram",
+    "noticiasbot_envios_fallidos_total": "Intentos de envío a Telegram fallidos",
+}
+
+Clave = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _clave(nombre: str, etiquetas: dict) -> Clave:
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formato_etiquetas(etiquetas, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(etiquetas) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+class _Histograma:
+    __slots__ = ("cuentas", "suma", "total")
+
+    def __init__(self):
+        self.cuentas = [0] * (len(LIMITES_SEGUNDOS) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.cuentas[bisect.bisect_left(LIMITES_SEGUNDOS, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[Clave, float] = {}
+        self._histogramas: Dict[Clave, _Histograma] = {}
+        self._contadores_ultimo_resumen: Dict[Clave, float] = {}
+
+    def incrementar(self, nombre: str, valor: float = 1.0, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0.0) + valor
+
+    def observar(self, nombre: str, segundos: float, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = _Histograma()
+            histograma.observar(segundos)
+
+    def texto_prometheus(self) -> str:
+        lineas = []
+        vistos = set()
+
+        def cabecera(nombre: str, tipo: str):
+            if nombre not in vistos:
+                vistos.add(nombre)
+                lineas.append(f"# HELP {nombre} {AYUDA.get(nombre, nombre)}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+
+        with self._lock:
+            for (nombre, etiquetas), valor in sorted(self._contadores.items()):
+                cabecera(nombre, "counter")
+                lineas.append(f"{nombre}{_formato_etiquetas(etiquetas)} {valor:g}")
+            for (nombre, etiquetas), h in sorted(self._histogramas.items()):
+                cabecera(nombre, "histogram")
+                acumulado = 0
+                for limite, cuenta in zip(LIMITES_SEGUNDOS + ("+Inf",), h.cuentas):
+                    acumulado += cuenta
+                    lineas.append(f"{nombre}_bucket{_formato_etiquetas(etiquetas, ('le', str(limite)))} {acumulado}")
+                lineas.append(f"{nombre}_sum{_formato_etiquetas(etiquetas)} {h.suma:.6f}")
+                lineas.append(f"{nombre}_count{_formato_etiquetas(etiquetas)} {h.total}")
+        return "\n".join(lineas) + "\n"
+
+    def contadores_desde_ultimo_resumen(self) -> Dict[str, float]:
+        with self._lock:
+            delta = {}
+            for clave, valor in self._contadores.items():
+                diferencia = valor - self._contadores_ultimo_resumen.get(clave, 0.0)
+                if diferencia:
+                    nombre, etiquetas = clave
+                    delta[nombre + _formato_etiquetas(etiquetas)] = diferencia
+            self._contadores_ultimo_resumen = dict(self._contadores)
+            return delta
+
+
+METRICAS = Metricas()
+
+
+@contextmanager
+def medir_duracion(etiqueta, registro: Optional[dict] = None):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        print(f"⏱ Tiempo en {etiqueta}: {duracion:.2f} segundos")
+        METRICAS.observar("noticiasbot_etapa_segundos", duracion, etapa=etiqueta)
+        if registro is not None:
+            registro[etiqueta] = duracion
+
+
+def pico_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return round(pico / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def marcar_arranque():
+    """
+    Se llama al empezar el trabajo: lo anterior (importaciones, carga del historial...) es arranque.
+    Solo cuenta la primera vez por proceso.
+    """
+    global _arranque_s
+    if _arranque_s is None:
+        _arranque_s = time.perf_counter() - INICIO_PROCESO
+
+
+def escribir_textfile(ruta: str):
+    """
+    Escritura atómica para el textfile collector de node_exporter (que no lea un fichero a medias).
+    """
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(METRICAS.texto_prometheus())
+    os.replace(temporal, ruta)
+
+
+def finalizar_ejecucion(duraciones: Optional[dict] = None, **extra):
+    """
+    Una línea JSON por ejecución (etapas y contadores de esta ejecución) y, si está configurado,
+    el volcado al fichero de métricas.
+    """
+    resumen = {
+        "evento": "ejecucion",
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "etapas": {k: round(v, 3) for k, v in (duraciones or {}).items()},
+        "contadores": METRICAS.contadores_desde_ultimo_resumen(),
+        "arranque_s": round(_arranque_s, 3) if _arranque_s is not None else None,
+        "pico_rss_mb": pico_rss_mb(),
+        **extra,
+    }
+    print(json.dumps(resumen, ensure_ascii=False))
+    if ARCHIVO_TEXTFILE:
+        escribir_textfile(ARCHIVO_TEXTFILE)
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = METRICAS.texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_servidor_metricas(puerto: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Sirve /metrics en un hilo aparte (para procesos largos como el demonio). Sin puerto
+    (ni METRICAS_PUERTO) no hace nada.
+    """
+    puerto = puerto or (int(PUERTO_METRICAS) if PUERTO_METRICAS else None)
+    if puerto is None:
+        return None
+    servidor = ThreadingHTTPServer(("0.0.0.0", puerto), _ManejadorMetricas)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f"📈 Métricas Prometheus en http://0.0.0.0:{puerto}/metrics")
+    return servidor
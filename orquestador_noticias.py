@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import asyncio
+import requests
+from io import BytesIO
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from metricas import METRICAS, finalizar_ejecucion, marcar_arranque, medir_duracion
+from imagen_sdxl import MAX_TAM_LOTE, generar_imagenes_lote
+from codificacion_imagen import imagen_error
+from servidor_imagenes import generar_imagenes_servidor
+from almacen_noticias import AlmacenNoticias
+from bandeja_salida import ESPERA_EN_EJECUCION, BandejaSalida, EnviadorTelegram
+from cliente_ollama import obtener_cliente
+from cache_llm import obtener_cache_llm
+from pipeline_noticias import Etapa, PipelineEtapas
+from ingesta_noticias import MAX_PAGINAS
+from similitud_noticias import IndiceSimilitud
+from lector_articulos import CONCURRENCIA as CONCURRENCIA_ARTICULOS, obtener_lector_articulos
+from puntuacion_noticias import Candidata, PuntuadorNoticias
+from resumen_estructurado import NoticiaEstructurada, extraer_noticia_estructurada
+
+# 🧭 Orquestación común de crear_noticia_ollama.py y crear_noticia_gcp.py: elegir la noticia,
+# resumirla, ilustrarla y dejarla en la bandeja de salida, una a una o en pipeline (--todas).
+# Cada script aporta lo que le es propio: de dónde salen las noticias y cómo se construye el
+# prompt de la imagen (marcas, personas, correcciones de conceptos).
+
+ARCHIVO_NOTICIAS = "noticias_publicadas.jsonl"
+# Historial antiguo en JSON: se importa la primera vez que se crea el JSONL
+ARCHIVO_NOTICIAS_ANTIGUO = "noticias_publicadas.json"
+# ENVIO_SEPARADO=1: solo se deja la publicación en la bandeja y la envía `python bandeja_salida.py`
+ENVIO_SEPARADO = os.getenv("ENVIO_SEPARADO", "0") == "1"
+# Resumen y conceptos en una sola llamada JSON al LLM (MODO_ESTRUCTURADO=0 vuelve a dos llamadas)
+MODO_ESTRUCTURADO = os.getenv("MODO_ESTRUCTURADO", "1") != "0"
+# Trabajadores de las etapas de LLM en el modo pipeline (--todas)
+PIPELINE_TRABAJADORES_LLM = int(os.getenv("PIPELINE_TRABAJADORES_LLM", "2"))
+
+PROMPT_RESUMEN = (
+    "Resume en español esta noticia en tres partes separadas por nueva línea:\n"
+    "1. TÍTULO: (máximo 15 palabras, en español)\n"
+    "2. RESUMEN: (1–2 frases claras en español)\n"
+    "3. COMENTARIO: (análisis de impacto o contexto tambien en español)\n\n"
+)
+
+Noticia = Tuple[str, str, datetime, str]
+
+
+def modelo_llm(prompt: str, model_name: str = "mistral",
+               validar: Optional[Callable[[str], bool]] = None, **opciones) -> str:
+    """
+    Llama al LLM pasando por la caché. Con `validar`, solo se guarda la respuesta si lo cumple
+    (un JSON inválido en caché haría que el reintento recibiera la misma respuesta).
+    """
+    cache = obtener_cache_llm()
+    if cache is not None:
+        respuesta = cache.obtener(model_name, prompt, opciones)
+        if respuesta is not None and (validar is None or validar(respuesta)):
+            return respuesta
+    try:
+        respuesta = obtener_cliente().chat(prompt, model_name, **opciones)
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        print(f"❌ Error al conectar con Ollama: {e}")
+        return ""
+    if cache is not None and respuesta and (validar is None or validar(respuesta)):
+        cache.guardar(model_name, prompt, opciones, respuesta)
+    return respuesta
+
+
+def generar_noticia_estructurada(texto: str) -> Optional[NoticiaEstructurada]:
+    return extraer_noticia_estructurada(texto, modelo_llm)
+
+
+def es_casi_duplicada(titulo: str, snippet: str, indice: IndiceSimilitud) -> bool:
+    parecida = indice.buscar(f"{titulo}. {snippet}")
+    if parecida is None:
+        return False
+    print(f"♻️ Descartada por casi duplicada ({parecida['similitud']:.0%}) de «{parecida['titulo']}»: {titulo}")
+    METRICAS.incrementar("noticiasbot_casi_duplicadas_total")
+    return True
+
+
+def generar_imagenes_local(prompts: List[str], semillas: Optional[List[Optional[int]]] = None) -> List[BytesIO]:
+    try:
+        # Si el servidor de imágenes está en marcha, el pipeline ya está cargado allí
+        imagenes, origen = generar_imagenes_servidor(prompts, semillas), "servidor"
+        if imagenes is None:
+            imagenes, origen = generar_imagenes_lote(prompts, semillas), "local"
+    except Exception as e:
+        print(f"❌ Error generando imagen: {e}")
+        imagenes, origen = [imagen_error() for _ in prompts], "respaldo"
+    METRICAS.incrementar("noticiasbot_imagenes_generadas_total", len(imagenes), origen=origen)
+    return [BytesIO(datos) for datos in imagenes]
+
+
+def imprimir_estadisticas_llm():
+    obtener_cliente().imprimir_estadisticas()
+    cache = obtener_cache_llm()
+    if cache is not None:
+        cache.imprimir_estadisticas()
+
+
+class OrquestadorNoticias:
+    """
+    Historial, bandeja de salida e índice de similitud del proceso, y los dos modos de publicación.
+    `obtener_noticias(query, pagina)` es síncrona (se llama en un hilo); `generar_conceptos`,
+    `depurar_conceptos` y `construir_prompt` son los del script.
+    """
+
+    def __init__(self, telegram_token: str, telegram_chat_id: str, telegram_api_url: str,
+                 obtener_noticias: Callable[[Optional[str], int], List[Noticia]],
+                 generar_conceptos: Callable[[str], List[str]],
+                 depurar_conceptos: Callable[[List[str]], List[str]],
+                 construir_prompt: Callable[[List[str], str], str],
+                 puntuador: PuntuadorNoticias):
+        self.telegram_token = telegram_token
+        self.telegram_chat_id = telegram_chat_id
+        self.telegram_api_url = telegram_api_url
+        self.obtener_noticias = obtener_noticias
+        self.generar_conceptos = generar_conceptos
+        self.depurar_conceptos = depurar_conceptos
+        self.construir_prompt = construir_prompt
+        self.puntuador = puntuador
+        self.almacen = AlmacenNoticias(ARCHIVO_NOTICIAS, importar_de=ARCHIVO_NOTICIAS_ANTIGUO)
+        self.bandeja = BandejaSalida()
+        # Huellas MinHash de lo publicado: descarta la misma noticia contada por otro medio
+        self.indice_similitud = IndiceSimilitud()
+        self._enviador: Optional[EnviadorTelegram] = None
+
+    def url_ya_publicada(self, url: str) -> bool:
+        # Las que esperan en la bandeja de salida ya están generadas: tampoco se repiten
+        return self.almacen.contiene(url) or self.bandeja.contiene_url(url)
+
+    def seleccionar_candidatas(self, noticias: List[Noticia]) -> List[Candidata]:
+        """
+        Quita las ya publicadas, las portadas y los listados, y ordena el resto de más a menos
+        relevante. Solo es NumPy sobre título y snippet: milisegundos aunque haya cientos.
+        """
+        return self.puntuador.ordenar([n for n in noticias if not self.url_ya_publicada(n[3])])
+
+    async def elegir_noticia(self) -> Optional[Candidata]:
+        """
+        La mejor candidata que no sea casi duplicada: solo esa llega al LLM. Si ninguna vale, se
+        piden las páginas siguientes de la búsqueda (hasta BUSQUEDA_MAX_PAGINAS).
+        """
+        for pagina in range(MAX_PAGINAS):
+            noticias = await asyncio.to_thread(self.obtener_noticias, None, pagina)
+            if not noticias:
+                return None
+            candidatas = self.seleccionar_candidatas(noticias)
+            elegida = next((c for c in candidatas
+                            if not es_casi_duplicada(c.noticia[0], c.noticia[1], self.indice_similitud)), None)
+            if elegida is not None:
+                return elegida
+        return None
+
+    def obtener_enviador(self) -> EnviadorTelegram:
+        """
+        El Bot de Telegram se crea la primera vez que hay algo que publicar, no al importar el script.
+        """
+        if self._enviador is None:
+            from telegram import Bot
+            bot = Bot(token=self.telegram_token, base_url=self.telegram_api_url)
+            self._enviador = EnviadorTelegram(bot, self.telegram_chat_id, self.bandeja, al_publicar=self.almacen.guardar)
+        return self._enviador
+
+    def ilustrar_lote(self, pedidos: List[Tuple[List[str], str]]) -> List[BytesIO]:
+        """
+        Una imagen por (conceptos, texto), todas en una sola llamada al pipeline de difusión.
+        Prompts e imágenes van en la misma llamada síncrona: ajustar el prompt carga y usa los
+        tokenizadores CLIP (disco o red la primera vez), así que tampoco puede ir en el bucle de eventos.
+        """
+        prompts = []
+        for conceptos, texto in pedidos:
+            prompts.append(self.construir_prompt(conceptos, texto))
+            print("🎨 Prompt visual final:\n", prompts[-1])
+        return generar_imagenes_local(prompts)
+
+    def ilustrar(self, conceptos: List[str], texto: str) -> BytesIO:
+        return self.ilustrar_lote([(conceptos, texto)])[0]
+
+    async def reintentar_bandeja(self, duraciones: Optional[dict] = None):
+        """
+        Envía lo que quedó pendiente en la bandeja de ejecuciones anteriores (solo lo que ya toca
+        reintentar), antes de buscar: aunque hoy no haya noticias nuevas, lo generado sale.
+        """
+        if ENVIO_SEPARADO or not self.bandeja.pendientes():
+            return
+        with medir_duracion("reintentar bandeja", duraciones):
+            enviadas = await self.obtener_enviador().drenar(esperar_reintentos=False)
+        print(f"📮 Bandeja de salida: {enviadas} publicaciones pendientes enviadas")
+
+    async def publicar_noticia(self, titulo_noticia: str, url_noticia: str, resumen: str, imagen: BytesIO):
+        texto_telegram = (
+            f"{resumen}\n\n"
+            f"🗓 *Publicado:* {datetime.now().strftime('%d/%m/%Y %H:%M')}\n"
+            f"🔗 Fuente: {url_noticia}"
+        )
+        # Primero a disco: si el envío falla, la noticia generada no se pierde y se reintenta
+        self.bandeja.encolar(titulo_noticia, url_noticia, texto_telegram, imagen.getvalue())
+        if not ENVIO_SEPARADO:
+            # Un intento por publicación: solo se esperan pausas cortas (RetryAfter, reintento sin
+            # Markdown); los errores de red quedan programados para ejecuciones posteriores
+            await self.obtener_enviador().drenar(max_espera=ESPERA_EN_EJECUCION)
+
+    async def enviar_noticia(self, duraciones: Optional[dict] = None) -> Optional[str]:
+        """
+        Publica la primera noticia nueva y devuelve su URL (None si no había ninguna).
+        Si se pasa `duraciones`, se rellena con el tiempo de cada etapa.
+        Buscar y deduplicar va antes que nada pesado: si no hay noticias nuevas no se llega a
+        importar torch/diffusers ni a crear el Bot de Telegram.
+        """
+        marcar_arranque()
+        duraciones = {} if duraciones is None else duraciones
+        await self.reintentar_bandeja(duraciones)
+        print("🔍 Buscando noticia relevante en Google News...")
+        elegida = await self.elegir_noticia()
+        if elegida is None:
+            print("❌ No se encontró ninguna noticia.")
+            finalizar_ejecucion(duraciones, url=None)
+            return None
+
+        titulo_noticia, snippet, _, url_noticia = elegida.noticia
+        print(f"🏅 Elegida (puntuación {elegida.puntuacion:.2f}): {titulo_noticia}")
+        texto = f"{titulo_noticia}. {snippet}"
+
+        # Sin modo estructurado, el resumen y la cadena conceptos → prompt → imagen no dependen
+        # entre sí: van en paralelo
+
+        async def generar_resumen() -> str:
+            with medir_duracion("generar resumen", duraciones):
+                resumen = await asyncio.to_thread(modelo_llm, PROMPT_RESUMEN + texto_llm)
+            print("🧠 Resumen generado:\n", resumen)
+            return resumen
+
+        async def generar_ilustracion(conceptos: Optional[List[str]] = None) -> BytesIO:
+            if conceptos is None:
+                with medir_duracion("extraer conceptos", duraciones):
+                    conceptos = await asyncio.to_thread(self.generar_conceptos, texto_llm)
+            print("🔑 Conceptos visuales extraídos:", conceptos)
+
+            with medir_duracion("generar imagen", duraciones):
+                return await asyncio.to_thread(self.ilustrar, conceptos, texto_llm)
+
+        # Lo medido hasta aquí (bandeja, búsqueda) no entra en el cálculo del solapamiento
+        previas = set(duraciones)
+        inicio = time.perf_counter()
+        # El texto del artículo (si está activado) solo va al LLM; la huella sigue siendo título y snippet
+        texto_llm = texto
+        lector = obtener_lector_articulos()
+        if lector is not None:
+            with medir_duracion("leer artículo", duraciones):
+                texto_llm = await asyncio.to_thread(lector.texto_para_llm, titulo_noticia, snippet, url_noticia)
+        noticia = None
+        if MODO_ESTRUCTURADO:
+            with medir_duracion("resumen y conceptos (JSON)", duraciones):
+                noticia = await asyncio.to_thread(generar_noticia_estructurada, texto_llm)
+
+        if noticia is not None:
+            resumen = noticia.texto_resumen()
+            print("🧠 Resumen generado:\n", resumen)
+            imagen = await generar_ilustracion(self.depurar_conceptos(noticia.conceptos))
+        else:
+            resumen, imagen = await asyncio.gather(generar_resumen(), generar_ilustracion())
+        reloj = time.perf_counter() - inicio
+        suma_etapas = sum(v for k, v in duraciones.items() if k not in previas)
+        print(f"⏱ Solapamiento: {suma_etapas:.2f} s de etapas en {reloj:.2f} s de reloj "
+              f"({suma_etapas - reloj:.2f} s ahorrados)")
+
+        with medir_duracion("enviar a Telegram", duraciones):
+            await self.publicar_noticia(titulo_noticia, url_noticia, resumen, imagen)
+        self.indice_similitud.anadir(texto, titulo_noticia, url_noticia)
+
+        imprimir_estadisticas_llm()
+        finalizar_ejecucion(duraciones, url=url_noticia)
+        return url_noticia
+
+    async def enviar_noticias_pipeline(self):
+        """
+        Modo de rendimiento: procesa todas las candidatas nuevas en un pipeline por etapas
+        (buscar → deduplicar → resumir → conceptos → imagen → publicar).
+        """
+        marcar_arranque()
+        duraciones = {}
+        await self.reintentar_bandeja(duraciones)
+        vistas = set()
+        # Casi-duplicados dentro de la misma búsqueda (varios medios con la misma noticia)
+        de_esta_ejecucion = IndiceSimilitud(None)
+
+        def deduplicar(noticia):
+            titulo_noticia, snippet, _, url_noticia = noticia
+            if url_noticia in vistas or self.url_ya_publicada(url_noticia):
+                return None
+            if (es_casi_duplicada(titulo_noticia, snippet, self.indice_similitud)
+                    or es_casi_duplicada(titulo_noticia, snippet, de_esta_ejecucion)):
+                return None
+            vistas.add(url_noticia)
+            texto = f"{titulo_noticia}. {snippet}"
+            de_esta_ejecucion.anadir(texto, titulo_noticia, url_noticia)
+            # "texto" es la huella (título y snippet); "texto_llm" lo que lee el LLM
+            return {"titulo": titulo_noticia, "url": url_noticia, "snippet": snippet, "texto": texto, "texto_llm": texto}
+
+        def leer_articulo(item):
+            item["texto_llm"] = lector.texto_para_llm(item["titulo"], item["snippet"], item["url"])
+            return item
+
+        def resumir(item):
+            noticia = generar_noticia_estructurada(item["texto_llm"]) if MODO_ESTRUCTURADO else None
+            if noticia is not None:
+                item["resumen"] = noticia.texto_resumen()
+                item["conceptos"] = self.depurar_conceptos(noticia.conceptos)
+            else:
+                item["resumen"] = modelo_llm(PROMPT_RESUMEN + item["texto_llm"])
+            return item
+
+        def extraer_conceptos(item):
+            if "conceptos" not in item:
+                item["conceptos"] = self.generar_conceptos(item["texto_llm"])
+            return item
+
+        def ilustrar(items):
+            imagenes = self.ilustrar_lote([(item["conceptos"], item["texto_llm"]) for item in items])
+            for item, imagen in zip(items, imagenes):
+                item["imagen"] = imagen
+            return items
+
+        async def publicar(item):
+            await self.publicar_noticia(item["titulo"], item["url"], item["resumen"], item["imagen"])
+            self.indice_similitud.anadir(item["texto"], item["titulo"], item["url"])
+            return item
+
+        lector = obtener_lector_articulos()
+        pipeline = PipelineEtapas([
+            Etapa("deduplicar", deduplicar),
+            # Descargas de artículos en paralelo (acotadas también dentro del lector)
+            *([Etapa("leer", leer_articulo, trabajadores=CONCURRENCIA_ARTICULOS)] if lector is not None else []),
+            Etapa("resumir", resumir, trabajadores=PIPELINE_TRABAJADORES_LLM),
+            Etapa("conceptos", extraer_conceptos, trabajadores=PIPELINE_TRABAJADORES_LLM),
+            # Una sola difusión a la vez (la GPU es el recurso compartido), con las noticias que
+            # se hayan acumulado mientras tanto en un mismo lote
+            Etapa("imagen", ilustrar, trabajadores=1, lote=MAX_TAM_LOTE, tam_cola=MAX_TAM_LOTE),
+            Etapa("publicar", publicar),
+        ])
+        print("🔍 Buscando noticias relevantes en Google News...")
+        estadisticas = await pipeline.ejecutar(
+            lambda: [c.noticia for c in self.seleccionar_candidatas(self.obtener_noticias(None, 0))]
+        )
+        imprimir_estadisticas_llm()
+        # "etapas" con el tiempo ocupado de cada una, como en el modo de una noticia; el detalle
+        # (colas, descartes, lotes, noticias/hora) va en "pipeline"
+        duraciones["buscar noticias"] = pipeline.tiempo_obtener
+        duraciones.update({e.nombre: e.tiempo_ocupado for e in pipeline.etapas})
+        finalizar_ejecucion(duraciones, modo="todas", pipeline=estadisticas)
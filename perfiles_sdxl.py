@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# ⏲️ Modo presupuesto de latencia: se elige un perfil (scheduler, pasos, resolución) según el tiempo
+# que cabe en el presupuesto. El coste de cada resolución en este equipo se calibra una vez,
+# t(pasos) = fijo + pasos·paso, se guarda en disco y se corrige con cada imagen generada.
+ARCHIVO_CALIBRACION = os.getenv("SDXL_CALIBRACION", "calibracion_sdxl.json")
+# Con dos mediciones de pocos pasos se separa el coste fijo (texto, VAE) del coste por paso
+PASOS_CALIBRACION = (2, 4)
+# Peso de cada medición nueva en la media móvil de la calibración
+SUAVIZADO = 0.3
+# Dentro de un perfil se pueden recortar pasos hasta esta fracción antes de pasar al siguiente
+FRACCION_MINIMA_PASOS = 0.75
+
+
+@dataclass(frozen=True)
+class Perfil:
+    nombre: str
+    scheduler: str
+    pasos: int
+    ancho: int
+    alto: int
+
+    @property
+    def resolucion(self) -> str:
+        return f"{self.ancho}x{self.alto}"
+
+
+# De más calidad a más rápido
+PERFILES = [
+    Perfil("calidad", "euler", 25, 896, 512),
+    Perfil("equilibrado", "dpmpp", 18, 896, 512),
+    Perfil("rapido", "dpmpp", 12, 768, 448),
+    Perfil("minimo", "dpmpp", 8, 640, 384),
+]
+# Con la LoRA de pocos pasos el scheduler es siempre LCM
+PERFILES_LCM = [
+    Perfil("lcm_calidad", "lcm", 8, 896, 512),
+    Perfil("lcm", "lcm", 6, 896, 512),
+    Perfil("lcm_rapido", "lcm", 4, 768, 448),
+    Perfil("lcm_minimo", "lcm", 4, 640, 384),
+]
+
+
+class CalibracionSDXL:
+    """
+    Coste fijo y por paso de cada resolución en este equipo. `huella` identifica el hardware y la
+    configuración con la que se midió: si cambia, la calibración guardada no vale.
+    """
+
+    def __init__(self, huella: str, ruta: str = ARCHIVO_CALIBRACION):
+        self.huella = huella
+        self.ruta = ruta
+        self.resoluciones: Dict[str, Dict[str, float]] = {}
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if datos.get("huella") == huella:
+            self.resoluciones = datos.get("resoluciones", {})
+        else:
+            print("⚠️ La calibración guardada es de otro equipo o configuración; se recalibrará")
+
+    def guardar(self):
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"huella": self.huella, "resoluciones": self.resoluciones}, f, indent=2)
+        os.replace(temporal, self.ruta)
+
+    def pendientes(self, perfiles: List[Perfil]) -> List[Perfil]:
+        """
+        Un perfil por cada resolución que aún no está calibrada.
+        """
+        vistos = {}
+        for perfil in perfiles:
+            if perfil.resolucion not in self.resoluciones:
+                vistos.setdefault(perfil.resolucion, perfil)
+        return list(vistos.values())
+
+    def calibrar(self, perfil: Perfil, tiempos: Tuple[float, float]):
+        """
+        `tiempos`: segundos de una imagen con PASOS_CALIBRACION[0] y PASOS_CALIBRACION[1] pasos.
+        """
+        (n1, n2), (t1, t2) = PASOS_CALIBRACION, tiempos
+        paso = max(1e-3, (t2 - t1) / (n2 - n1))
+        self.resoluciones[perfil.resolucion] = {"fijo_s": max(0.0, t1 - n1 * paso), "paso_s": paso}
+
+    def estimar(self, perfil: Perfil, pasos: Optional[int] = None) -> float:
+        coste = self.resoluciones[perfil.resolucion]
+        return coste["fijo_s"] + (pasos or perfil.pasos) * coste["paso_s"]
+
+    def elegir(self, presupuesto_s: float, perfiles: List[Perfil]) -> Tuple[Perfil, int]:
+        """
+        El primer perfil (de más calidad a menos) que cabe en el presupuesto, recortando pasos si
+        hace falta. Si ninguno cabe, el más rápido con los pasos que quepan (al menos 1).
+        """
+        for perfil in perfiles:
+            coste = self.resoluciones[perfil.resolucion]
+            pasos = min(perfil.pasos, math.floor((presupuesto_s - coste["fijo_s"]) / coste["paso_s"]))
+            if pasos >= math.ceil(perfil.pasos * FRACCION_MINIMA_PASOS):
+                return perfil, pasos
+        ultimo = perfiles[-1]
+        coste = self.resoluciones[ultimo.resolucion]
+        return ultimo, max(1, min(ultimo.pasos, math.floor((presupuesto_s - coste["fijo_s"]) / coste["paso_s"])))
+
+    def registrar(self, perfil: Perfil, pasos: int, total_s: float, paso_s: float):
+        """
+        Corrige la calibración con lo medido en una generación real: si el equipo va más lento
+        de lo calibrado, las siguientes elecciones bajarán de pasos o de perfil.
+        """
+        coste = self.resoluciones[perfil.resolucion]
+        fijo_s = max(0.0, total_s - pasos * paso_s)
+        coste["paso_s"] += SUAVIZADO * (paso_s - coste["paso_s"])
+        coste["fijo_s"] += SUAVIZADO * (fijo_s - coste["fijo_s"])
+        self.guardar()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import time
+import asyncio
+import inspect
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional
+
+# 🏭 Pipeline por etapas para procesar varias noticias a la vez: cada etapa tiene sus propios
+# trabajadores y una cola acotada delante, así el LLM de la noticia N+1 se solapa con la
+# difusión de la N y con la subida a Telegram de la N-1.
+
+_FIN = object()
+
+
+@dataclass
+class Etapa:
+    nombre: str
+    funcion: Callable[[Any], Any]
+    trabajadores: int = 1
+    tam_cola: int = 2
+    # Con lote > 1 la función recibe una lista de elementos (los que ya esperan en la cola, hasta
+    # `lote`) y devuelve una lista del mismo tamaño; None descarta ese elemento
+    lote: int = 1
+    # Estadísticas
+    procesados: int = 0
+    descartados: int = 0
+    errores: int = 0
+    tiempo_ocupado: float = 0.0
+    profundidad_max: int = 0
+    lotes: int = 0
+    cola: Optional[asyncio.Queue] = field(default=None, repr=False)
+
+    async def aplicar(self, item):
+        # Las funciones síncronas (LLM, difusión) van a un hilo para no bloquear el bucle
+        if inspect.iscoroutinefunction(self.funcion):
+            return await self.funcion(item)
+        return await asyncio.to_thread(self.funcion, item)
+
+    async def aplicar_lote(self, items: list) -> list:
+        if self.lote == 1:
+            return [await self.aplicar(items[0])]
+        resultados = await self.aplicar(items)
+        if len(resultados) != len(items):
+            raise ValueError(f"La etapa '{self.nombre}' devolvió {len(resultados)} resultados para {len(items)} elementos")
+        return resultados
+
+
+class PipelineEtapas:
+    """
+    Encadena etapas con colas acotadas. Una etapa que devuelve None descarta el elemento;
+    una excepción se registra y descarta solo ese elemento.
+    """
+
+    def __init__(self, etapas: List[Etapa], intervalo_informe: float = 30.0):
+        self.etapas = etapas
+        self.intervalo_informe = intervalo_informe
+        self.completados = 0
+        self.tiempo_obtener = 0.0
+
+    async def _trabajador(self, indice: int):
+        etapa = self.etapas[indice]
+        salida = self.etapas[indice + 1].cola if indice + 1 < len(self.etapas) else None
+        while True:
+            item = await etapa.cola.get()
+            if item is _FIN:
+                etapa.cola.task_done()
+                return
+            # En una etapa por lotes se toma además lo que ya esté esperando, sin esperar a más
+            items = [item]
+            fin = False
+            while len(items) < etapa.lote and not etapa.cola.empty():
+                siguiente = etapa.cola.get_nowait()
+                if siguiente is _FIN:
+                    fin = True
+                    break
+                items.append(siguiente)
+            inicio = time.perf_counter()
+            try:
+                resultados = await etapa.aplicar_lote(items)
+            except Exception as e:
+                etapa.errores += len(items)
+                print(f"❌ Error en la etapa '{etapa.nombre}': {e}")
+                resultados = [None] * len(items)
+            etapa.tiempo_ocupado += time.perf_counter() - inicio
+            etapa.procesados += len(items)
+            etapa.lotes += 1
+            for resultado in resultados:
+                if resultado is None:
+                    etapa.descartados += 1
+                elif salida is not None:
+                    await salida.put(resultado)
+                    siguiente = self.etapas[indice + 1]
+                    siguiente.profundidad_max = max(siguiente.profundidad_max, salida.qsize())
+                else:
+                    self.completados += 1
+            for _ in items:
+                etapa.cola.task_done()
+            if fin:
+                etapa.cola.task_done()
+                return
+
+    def _profundidades(self) -> str:
+        return " | ".join(f"{e.nombre}: {e.cola.qsize()}/{e.cola.maxsize}" for e in self.etapas)
+
+    async def _informar(self):
+        while True:
+            await asyncio.sleep(self.intervalo_informe)
+            print(f"📦 Colas → {self._profundidades()}")
+
+    async def ejecutar(self, obtener: Callable[[], Iterable[Any]]) -> dict:
+        """
+        Ejecuta `obtener` (la etapa de búsqueda) y empuja sus elementos por el pipeline.
+        Devuelve las estadísticas de la ejecución (ver `estadisticas`).
+        """
+        for etapa in self.etapas:
+            etapa.cola = asyncio.Queue(maxsize=etapa.tam_cola)
+        trabajadores = [
+            [asyncio.create_task(self._trabajador(i)) for _ in range(etapa.trabajadores)]
+            for i, etapa in enumerate(self.etapas)
+        ]
+        informe = asyncio.create_task(self._informar())
+        inicio = time.perf_counter()
+        try:
+            elementos = await asyncio.to_thread(lambda: list(obtener()))
+            self.tiempo_obtener = time.perf_counter() - inicio
+            primera = self.etapas[0]
+            for item in elementos:
+                await primera.cola.put(item)
+                primera.profundidad_max = max(primera.profundidad_max, primera.cola.qsize())
+
+            # Cerramos etapa a etapa: cuando terminan los trabajadores de una, avisamos a la siguiente
+            for etapa, tareas in zip(self.etapas, trabajadores):
+                for _ in tareas:
+                    await etapa.cola.put(_FIN)
+                await asyncio.gather(*tareas)
+        finally:
+            informe.cancel()
+            for tareas in trabajadores:
+                for tarea in tareas:
+                    tarea.cancel()
+        duracion = time.perf_counter() - inicio
+        self.imprimir_resumen(duracion, len(elementos))
+        return self.estadisticas(duracion, len(elementos))
+
+    def estadisticas(self, duracion: float, obtenidos: int) -> dict:
+        """
+        Lo mismo que imprimir_resumen, como diccionario para el resumen JSON de la ejecución.
+        """
+        return {
+            "duracion_s": round(duracion, 3),
+            "candidatas": obtenidos,
+            "completadas": self.completados,
+            "noticias_hora": round(self.completados / duracion * 3600, 1) if duracion > 0 else 0.0,
+            "busqueda_s": round(self.tiempo_obtener, 3),
+            "etapas": {
+                e.nombre: {
+                    "procesados": e.procesados,
+                    "descartados": e.descartados,
+                    "errores": e.errores,
+                    "ocupado_s": round(e.tiempo_ocupado, 3),
+                    "cola_max": e.profundidad_max,
+                    "tam_cola": e.tam_cola,
+                    "trabajadores": e.trabajadores,
+                    **({"por_lote": round(e.procesados / e.lotes, 2)} if e.lote > 1 and e.lotes else {}),
+                }
+                for e in self.etapas
+            },
+        }
+
+    def imprimir_resumen(self, duracion: float, obtenidos: int):
+        por_hora = self.completados / duracion * 3600 if duracion > 0 else 0.0
+        print(f"🏁 Pipeline: {obtenidos} candidatas, {self.completados} completadas en {duracion:.2f} s "
+              f"({por_hora:.1f} noticias/hora); búsqueda {self.tiempo_obtener:.2f} s")
+        for e in self.etapas:
+            print(f"   • {e.nombre}: {e.procesados} procesados, {e.descartados} descartados, {e.errores} errores, "
+                  f"{e.tiempo_ocupado:.2f} s ocupados, cola máx {e.profundidad_max}/{e.tam_cola} "
+                  f"({e.trabajadores} trabajador(es))"
+                  + (f", {e.procesados / e.lotes:.1f} por lote" if e.lote > 1 and e.lotes else ""))
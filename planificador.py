@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import random
+import signal
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Optional, Tuple
+
+# ⏰ Demonio con planificador asyncio: ejecuta la tarea cada cierto intervalo (con jitter),
+# respeta unas horas de silencio, no solapa ejecuciones y mantiene los modelos cargados entre ticks.
+INTERVALO_MIN = float(os.getenv("DEMONIO_INTERVALO_MIN", "60"))
+JITTER_MIN = float(os.getenv("DEMONIO_JITTER_MIN", "5"))
+# Formato "HH-HH"; puede cruzar la medianoche ("23-7"). Vacío = sin horas de silencio
+HORAS_SILENCIO = os.getenv("DEMONIO_HORAS_SILENCIO", "")
+DURACION_MAX_MIN = float(os.getenv("DEMONIO_DURACION_MAX_MIN", "30"))
+ARCHIVO_ESTADO = os.getenv("DEMONIO_ESTADO", "estado_demonio.json")
+
+
+def parsear_horas_silencio(texto: str) -> Optional[Tuple[int, int]]:
+    if not texto.strip():
+        return None
+    inicio, fin = texto.split("-")
+    return int(inicio), int(fin)
+
+
+def en_horas_silencio(momento: datetime, horas: Optional[Tuple[int, int]]) -> bool:
+    if horas is None:
+        return False
+    inicio, fin = horas
+    if inicio <= fin:
+        return inicio <= momento.hour < fin
+    return momento.hour >= inicio or momento.hour < fin
+
+
+class Demonio:
+    """
+    Ejecuta `tarea` periódicamente en el mismo proceso. Si la ejecución anterior sigue en marcha
+    o se pasó de la duración máxima, se salta el siguiente tick. El estado de la última ejecución
+    se guarda en ARCHIVO_ESTADO y en `ultima_ejecucion`.
+    """
+
+    def __init__(self, tarea: Callable[[], Awaitable[None]],
+                 calentar: Optional[Callable[[], None]] = None,
+                 intervalo_min: float = INTERVALO_MIN, jitter_min: float = JITTER_MIN,
+                 horas_silencio: str = HORAS_SILENCIO, duracion_max_min: float = DURACION_MAX_MIN,
+                 archivo_estado: str = ARCHIVO_ESTADO):
+        self.tarea = tarea
+        self.calentar = calentar
+        self.intervalo = intervalo_min * 60
+        self.jitter = jitter_min * 60
+        self.horas_silencio = parsear_horas_silencio(horas_silencio)
+        self.duracion_max = duracion_max_min * 60
+        self.archivo_estado = archivo_estado
+        self.ultima_ejecucion: dict = {}
+        self._en_curso: Optional[asyncio.Task] = None
+        self._inicio_en_curso = 0.0
+        self._saltar_siguiente = False
+        self._parar = asyncio.Event()
+
+    def _guardar_estado(self):
+        with open(self.archivo_estado, "w", encoding="utf-8") as f:
+            json.dump(self.ultima_ejecucion, f, ensure_ascii=False, indent=2)
+
+    async def _ejecutar_una_vez(self):
+        inicio = time.perf_counter()
+        self.ultima_ejecucion = {"inicio": datetime.now().isoformat(timespec="seconds"), "estado": "en curso"}
+        self._guardar_estado()
+        try:
+            await self.tarea()
+            estado = "ok"
+        except Exception as e:
+            print(f"❌ Error en la ejecución programada: {e}")
+            estado = f"error: {e}"
+        duracion = time.perf_counter() - inicio
+        self.ultima_ejecucion.update({"estado": estado, "duracion_s": round(duracion, 2)})
+        if duracion > self.duracion_max:
+            print(f"⚠️ La ejecución duró {duracion / 60:.1f} min (máx {self.duracion_max / 60:.0f}); se salta el siguiente tick")
+            self._saltar_siguiente = True
+        print(f"⏱ Ejecución programada terminada en {duracion:.2f} s ({estado})")
+        self._guardar_estado()
+
+    def _tick(self):
+        ahora = datetime.now()
+        if en_horas_silencio(ahora, self.horas_silencio):
+            print(f"🌙 {ahora:%H:%M} dentro de las horas de silencio; no se ejecuta")
+        elif self._en_curso is not None and not self._en_curso.done():
+            transcurrido = time.perf_counter() - self._inicio_en_curso
+            print(f"⏭️ La ejecución anterior sigue en marcha ({transcurrido / 60:.1f} min); se salta este tick")
+        elif self._saltar_siguiente:
+            print("⏭️ Tick saltado porque la ejecución anterior se pasó de la duración máxima")
+            self._saltar_siguiente = False
+        else:
+            self._inicio_en_curso = time.perf_counter()
+            self._en_curso = asyncio.create_task(self._ejecutar_una_vez())
+
+    def parar(self):
+        print("🛑 Señal de parada recibida; terminando tras la ejecución en curso...")
+        self._parar.set()
+
+    async def ejecutar(self):
+        bucle = asyncio.get_running_loop()
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                bucle.add_signal_handler(senal, self.parar)
+            except (NotImplementedError, RuntimeError):
+                # Windows: no hay add_signal_handler; Ctrl+C llega como KeyboardInterrupt
+                pass
+
+        if self.calentar is not None:
+            inicio = time.perf_counter()
+            print("🔥 Cargando modelos para mantenerlos en memoria entre ejecuciones...")
+            await asyncio.to_thread(self.calentar)
+            print(f"✅ Modelos listos en {time.perf_counter() - inicio:.2f} s")
+
+        print(f"⏰ Demonio activo: cada {self.intervalo / 60:.0f} ± {self.jitter / 60:.0f} min")
+        while not self._parar.is_set():
+            self._tick()
+            espera = max(1.0, self.intervalo + random.uniform(-self.jitter, self.jitter))
+            print(f"💤 Próximo tick a las {datetime.fromtimestamp(time.time() + espera):%H:%M:%S}")
+            try:
+                await asyncio.wait_for(self._parar.wait(), timeout=espera)
+            except asyncio.TimeoutError:
+                pass
+
+        if self._en_curso is not None and not self._en_curso.done():
+            await self._en_curso
+        print("👋 Demonio detenido")
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+from metricas import METRICAS
+
+# 🎟️ Turnos del bot de chat: N huecos de modelo a la vez (los mismos que OLLAMA_NUM_PARALLEL en el
+# servidor de Ollama) y reparto por turnos entre chats: quien manda diez preguntas no deja esperando
+# a quien manda una. Con la cola llena se rechaza con un mensaje en lugar de acumular sin límite.
+HUECOS = int(os.getenv("CHAT_HUECOS", os.getenv("OLLAMA_NUM_PARALLEL", "1")))
+MAX_POR_USUARIO = int(os.getenv("CHAT_MAX_POR_USUARIO", "3"))
+MAX_EN_COLA = int(os.getenv("CHAT_MAX_EN_COLA", "20"))
+# Cada cuánto se revisa la posición de quien espera (solo se avisa si ha cambiado)
+INTERVALO_AVISO_S = float(os.getenv("CHAT_INTERVALO_AVISO_S", "2"))
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+class ColaLlena(Exception):
+    """
+    La petición no se encola: el usuario ya tiene demasiadas pendientes o la cola global está llena.
+    """
+
+    def __init__(self, motivo: str):
+        super().__init__(motivo)
+        self.motivo = motivo
+
+
+class _Peticion:
+    __slots__ = ("id_chat", "futuro", "encolada")
+
+    def __init__(self, id_chat: int, futuro: asyncio.Future):
+        self.id_chat = id_chat
+        self.futuro = futuro
+        self.encolada = time.perf_counter()
+
+
+class PlanificadorChat:
+    """
+    Una cola por chat y una rueda con los chats que tienen peticiones: cada hueco que se libera
+    va a la primera petición del siguiente chat de la rueda. Todo ocurre en el bucle de eventos del
+    bot, así que no hace falta bloqueo; los futuros se crean en el bucle que llama.
+    """
+
+    def __init__(self, huecos: int = HUECOS, max_por_usuario: int = MAX_POR_USUARIO,
+                 max_en_cola: int = MAX_EN_COLA, intervalo_aviso_s: float = INTERVALO_AVISO_S):
+        self.huecos = max(1, huecos)
+        self.max_por_usuario = max_por_usuario
+        self.max_en_cola = max_en_cola
+        self.intervalo_aviso_s = intervalo_aviso_s
+        self._colas: Dict[int, Deque[_Peticion]] = {}
+        self._rueda: Deque[int] = deque()
+        self._en_servicio: Dict[int, int] = {}
+        self._esperas = deque(maxlen=1000)
+        self._servicios = deque(maxlen=1000)
+        self.atendidas = 0
+        self.rechazadas = 0
+
+    @property
+    def ocupados(self) -> int:
+        return sum(self._en_servicio.values())
+
+    @property
+    def en_cola(self) -> int:
+        return sum(len(cola) for cola in self._colas.values())
+
+    def posicion(self, peticion: _Peticion) -> int:
+        """
+        Cuántas peticiones se atenderán antes que esta, más uno, según el reparto por turnos:
+        de cada chat pasan tantas como rondas faltan (una más si va antes en la rueda).
+        """
+        cola = self._colas.get(peticion.id_chat)
+        if not cola or peticion not in cola:
+            return 0
+        ronda = cola.index(peticion)
+        delante = ronda
+        antes_en_rueda = True
+        for id_chat in self._rueda:
+            if id_chat == peticion.id_chat:
+                antes_en_rueda = False
+                continue
+            delante += min(len(self._colas[id_chat]), ronda + antes_en_rueda)
+        return delante + 1
+
+    def _despachar(self):
+        while self.ocupados < self.huecos and self._rueda:
+            id_chat = self._rueda.popleft()
+            cola = self._colas[id_chat]
+            peticion = cola.popleft()
+            if cola:
+                self._rueda.append(id_chat)
+            else:
+                del self._colas[id_chat]
+            self._en_servicio[id_chat] = self._en_servicio.get(id_chat, 0) + 1
+            peticion.futuro.set_result(None)
+
+    def _liberar(self, id_chat: int):
+        self._en_servicio[id_chat] -= 1
+        if not self._en_servicio[id_chat]:
+            del self._en_servicio[id_chat]
+        self._despachar()
+
+    def _quitar_de_la_cola(self, peticion: _Peticion):
+        cola = self._colas.get(peticion.id_chat)
+        if cola and peticion in cola:
+            cola.remove(peticion)
+            if not cola:
+                del self._colas[peticion.id_chat]
+                self._rueda.remove(peticion.id_chat)
+
+    def _admitir(self, id_chat: int):
+        pendientes = len(self._colas.get(id_chat, ())) + self._en_servicio.get(id_chat, 0)
+        if pendientes >= self.max_por_usuario:
+            motivo = "usuario"
+        elif self.ocupados >= self.huecos and self.en_cola >= self.max_en_cola:
+            motivo = "global"
+        else:
+            return
+        self.rechazadas += 1
+        METRICAS.incrementar("noticiasbot_chat_rechazos_total", motivo=motivo)
+        raise ColaLlena(motivo)
+
+    @asynccontextmanager
+    async def turno(self, id_chat: int, avisar: Optional[Callable[[int], Awaitable[None]]] = None):
+        """
+        Espera un hueco para `id_chat` y lo ocupa mientras dura el bloque. Lanza ColaLlena si no
+        se admite. Mientras espera, llama a `avisar(posicion)` al encolarse y cada vez que cambie.
+        """
+        self._admitir(id_chat)
+        peticion = _Peticion(id_chat, asyncio.get_running_loop().create_future())
+        if id_chat not in self._colas:
+            self._colas[id_chat] = deque()
+            self._rueda.append(id_chat)
+        self._colas[id_chat].append(peticion)
+        self._despachar()
+
+        try:
+            ultima_posicion = None
+            while not peticion.futuro.done():
+                posicion = self.posicion(peticion)
+                if avisar is not None and posicion != ultima_posicion:
+                    ultima_posicion = posicion
+                    try:
+                        await avisar(posicion)
+                    except Exception as e:
+                        print(f"⚠️ No se pudo avisar de la posición en la cola: {e}")
+                    continue
+                try:
+                    await asyncio.wait_for(asyncio.shield(peticion.futuro), self.intervalo_aviso_s)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # Cancelada esperando: si ya tenía hueco se devuelve, si no se sale de la cola
+            if peticion.futuro.done():
+                self._liberar(id_chat)
+            else:
+                peticion.futuro.cancel()
+                self._quitar_de_la_cola(peticion)
+            raise
+
+        inicio = time.perf_counter()
+        espera = inicio - peticion.encolada
+        try:
+            yield
+        finally:
+            servicio = time.perf_counter() - inicio
+            self._liberar(id_chat)
+            self.atendidas += 1
+            self._esperas.append(espera)
+            self._servicios.append(servicio)
+            METRICAS.observar("noticiasbot_chat_espera_segundos", espera)
+            METRICAS.observar("noticiasbot_chat_servicio_segundos", servicio)
+            print(f"⏱ Chat {id_chat}: {espera:.2f} s en cola, {servicio:.2f} s de servicio")
+
+    def estadisticas(self) -> Dict[str, float]:
+        esperas = list(self._esperas)
+        servicios = list(self._servicios)
+        return {
+            "huecos": self.huecos,
+            "atendidas": self.atendidas,
+            "rechazadas": self.rechazadas,
+            "espera_p50": round(_percentil(esperas, 0.50), 4),
+            "espera_p95": round(_percentil(esperas, 0.95), 4),
+            "servicio_p50": round(_percentil(servicios, 0.50), 4),
+            "servicio_p95": round(_percentil(servicios, 0.95), 4),
+        }
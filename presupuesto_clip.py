@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+from imagen_sdxl import MODELO_ID
+
+# 🧮 Presupuesto de tokens CLIP: SDXL tiene dos codificadores de texto con un límite de 77 tokens
+# (75 útiles, más inicio y fin) y trunca en silencio lo que sobra. Contamos con los tokenizadores
+# reales y compactamos el prompt por prioridad hasta que quepa en ambos.
+MAX_TOKENS_CLIP = 75
+# Los segmentos con esta prioridad o más nunca se eliminan
+PRIORIDAD_FIJA = 10
+
+# Se cargan una vez; el benchmark los fija antes con los tokenizadores diminutos
+TOKENIZADORES = None
+_LOCK_TOKENIZADORES = threading.Lock()
+
+
+@dataclass
+class Segmento:
+    texto: str
+    prioridad: int
+    corto: Optional[str] = None
+
+
+def obtener_tokenizadores():
+    """
+    Carga solo los dos tokenizadores de SDXL (no el pipeline). Devuelve una lista vacía si no
+    se pueden cargar, y entonces se usa la estimación por palabras.
+    """
+    global TOKENIZADORES
+    with _LOCK_TOKENIZADORES:
+        if TOKENIZADORES is None:
+            try:
+                from transformers import CLIPTokenizer
+                TOKENIZADORES = [
+                    CLIPTokenizer.from_pretrained(MODELO_ID, subfolder="tokenizer"),
+                    CLIPTokenizer.from_pretrained(MODELO_ID, subfolder="tokenizer_2"),
+                ]
+            except Exception as e:
+                print(f"⚠️ No se pudieron cargar los tokenizadores CLIP ({e}); se usará una estimación")
+                TOKENIZADORES = []
+        return TOKENIZADORES
+
+
+def contar_tokens_estimada(prompt: str) -> int:
+    return len(prompt.replace(",", "").split())
+
+
+def contar_tokens_clip(prompt: str) -> int:
+    """
+    Tokens del prompt sin contar inicio y fin; el máximo de los dos codificadores.
+    """
+    tokenizadores = obtener_tokenizadores()
+    if not tokenizadores:
+        return contar_tokens_estimada(prompt)
+    return max(len(t(prompt, add_special_tokens=False)["input_ids"]) for t in tokenizadores)
+
+
+def unir_segmentos(segmentos: List[Segmento]) -> str:
+    return ", ".join(s.texto for s in segmentos)
+
+
+def ajustar_prompt(segmentos: List[Segmento], max_tokens: int = MAX_TOKENS_CLIP) -> str:
+    """
+    Mientras el prompt no quepa, acorta (si tiene versión corta) o elimina el segmento de menor
+    prioridad; a igual prioridad, el que va más al final.
+    """
+    segmentos = list(segmentos)
+    tokens = contar_tokens_clip(unir_segmentos(segmentos))
+    while tokens > max_tokens:
+        candidatos = [i for i, s in enumerate(segmentos) if s.prioridad < PRIORIDAD_FIJA]
+        if not candidatos:
+            print(f"⚠️ El prompt sigue ocupando {tokens} tokens sin nada más que recortar; SDXL lo truncará")
+            break
+        i = min(candidatos, key=lambda j: (segmentos[j].prioridad, -j))
+        segmento = segmentos[i]
+        if segmento.corto:
+            print(f"✂️ Presupuesto CLIP ({tokens}/{max_tokens}): acortado '{segmento.texto}' → '{segmento.corto}'")
+            segmentos[i] = Segmento(segmento.corto, segmento.prioridad)
+        else:
+            print(f"🗑️ Presupuesto CLIP ({tokens}/{max_tokens}): eliminado '{segmento.texto}'")
+            del segmentos[i]
+        tokens = contar_tokens_clip(unir_segmentos(segmentos))
+
+    print(f"🧮 Tokens CLIP: {tokens} / {max_tokens}")
+    return unir_segmentos(segmentos)
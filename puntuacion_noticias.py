@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import zlib
+from urllib.parse import urlsplit
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from metricas import METRICAS
+from similitud_noticias import normalizar_texto
+
+# 🏅 Puntuación de candidatas antes de gastar nada caro: la búsqueda devuelve también portadas,
+# listados y agregadores ("Latest News | NVIDIA Newsroom", reddit.com/r/artificial) y cada una
+# cuesta dos llamadas al LLM y una difusión. Las páginas con forma de índice se descartan por la URL
+# y el resto se ordena por TF-IDF (términos con hashing a DIMENSIONES columnas) contra un perfil del tema.
+DIMENSIONES = 2 ** 12
+PUNTUACION_MINIMA = float(os.getenv("PUNTUACION_MINIMA", "0"))
+
+# Perfil del tema: término (o par de términos) → peso
+PERFIL_TEMA: Dict[str, float] = {
+    "ai": 1.0, "agent": 2.0, "agents": 2.0, "agentic": 2.0, "model": 1.5, "models": 1.5, "llm": 1.5,
+    "launches": 1.0, "launch": 1.0, "releases": 1.0, "unveils": 1.0, "announces": 1.0, "introduces": 1.0,
+    "research": 1.0, "researchers": 1.0, "open source": 1.0, "reasoning": 1.0, "multimodal": 1.0,
+    "robotics": 0.8, "chip": 0.8, "benchmark": 0.8, "autonomous": 1.0, "assistant": 1.0,
+    "ai agent": 3.0, "ai agents": 3.0, "language model": 1.5, "generative ai": 1.0,
+}
+
+# Últimos segmentos de ruta típicos de listados y portadas
+SEGMENTOS_LISTADO = {
+    "news", "latest", "noticias", "blog", "blogs", "topics", "topic", "tag", "tags", "category",
+    "categories", "archive", "archives", "search", "this-week", "today", "newsroom", "press", "home",
+    "index", "index.html", "feed", "rss", "page", "author", "authors", "sections", "section", "hub",
+}
+# Segmentos que, en cualquier posición, indican un listado
+SEGMENTOS_LISTADO_EN_RUTA = {"tag", "tags", "category", "categories", "topics", "author", "search", "page"}
+# Títulos de recopilatorio o portada ("Latest AI News | ...", "Daily ... - Last 7 Days")
+PATRON_TITULO_LISTADO = re.compile(
+    r"\b(?:latest|daily|weekly|top)\b.{0,40}\bnews\b|\bnews\b\s*[|:–-]|\blast \d+ days\b|\bround-?up\b|\bnewsletter\b",
+    re.IGNORECASE,
+)
+PATRON_FECHA_EN_RUTA = re.compile(r"/20\d\d/(?:[01]?\d/)?")
+PENALIZACION_TITULO = 0.5
+BONUS_FECHA = 0.1
+BONUS_SLUG = 0.1
+
+
+class Candidata(NamedTuple):
+    puntuacion: float
+    noticia: Tuple
+    motivo: str
+
+
+def motivo_listado(url: str) -> str:
+    """
+    Por qué la URL tiene forma de portada o listado ("" si parece un artículo).
+    """
+    partes = urlsplit(url)
+    segmentos = [s.lower() for s in partes.path.split("/") if s]
+    if not segmentos:
+        return "portada"
+    if "reddit.com" in partes.netloc and "comments" not in segmentos:
+        return "subreddit"
+    if SEGMENTOS_LISTADO_EN_RUTA.intersection(segmentos[:-1]) or segmentos[-1] in SEGMENTOS_LISTADO:
+        return "listado"
+    if segmentos[-1].isdigit() and len(segmentos) >= 2 and segmentos[-2] == "page":
+        return "listado"
+    if re.fullmatch(r"(?:19|20)\d\d(?:/\d{1,2}){0,2}", "/".join(segmentos)):
+        return "archivo"
+    return ""
+
+
+def _terminos(texto: str) -> List[str]:
+    palabras = normalizar_texto(texto)
+    return palabras + [f"{a} {b}" for a, b in zip(palabras, palabras[1:])]
+
+
+def _columnas(terminos: Iterable[str]) -> np.ndarray:
+    return np.fromiter((zlib.crc32(t.encode("utf-8")) % DIMENSIONES for t in terminos), dtype=np.int64)
+
+
+class PuntuadorNoticias:
+    """
+    Ordena candidatas (titulo, snippet, fecha, url) de más a menos relevante. El IDF sale del propio
+    lote de candidatas: un término que aparece en todas ("ai", "news") apenas distingue.
+    """
+
+    def __init__(self, perfil: Dict[str, float] = PERFIL_TEMA, terminos_extra: Iterable[str] = (),
+                 minima: float = PUNTUACION_MINIMA):
+        pesos = dict(perfil)
+        for termino in terminos_extra:
+            for t in _terminos(termino):
+                pesos.setdefault(t, 1.0)
+        self.perfil = np.zeros(DIMENSIONES)
+        np.add.at(self.perfil, _columnas(pesos), np.fromiter(pesos.values(), dtype=float))
+        self.perfil /= np.linalg.norm(self.perfil)
+        self.minima = minima
+
+    def puntuar(self, textos: Sequence[str]) -> np.ndarray:
+        """
+        Similitud coseno TF-IDF de cada texto con el perfil del tema.
+        """
+        filas, columnas = [], []
+        for i, texto in enumerate(textos):
+            c = _columnas(_terminos(texto))
+            filas.append(np.full(len(c), i))
+            columnas.append(c)
+        if not textos:
+            return np.zeros(0)
+        # Matriz dispersa en coordenadas: solo se opera con las celdas no nulas
+        celdas, tf = np.unique(np.concatenate(filas) * DIMENSIONES + np.concatenate(columnas), return_counts=True)
+        fila, columna = np.divmod(celdas, DIMENSIONES)
+        df = np.bincount(columna, minlength=DIMENSIONES)
+        idf = np.log((1 + len(textos)) / (1 + df)) + 1
+        valores = np.log1p(tf) * idf[columna]
+        normas = np.sqrt(np.bincount(fila, valores ** 2, minlength=len(textos)))
+        normas[normas == 0] = 1.0
+        return np.bincount(fila, valores * self.perfil[columna], minlength=len(textos)) / normas
+
+    def ordenar(self, noticias: Sequence[Tuple]) -> List[Candidata]:
+        """
+        Descarta portadas y listados y devuelve el resto ordenado por puntuación
+        (relevancia + pistas de artículo en la URL − penalización por título de recopilatorio).
+        """
+        admitidas = []
+        for noticia in noticias:
+            motivo = motivo_listado(noticia[3])
+            if motivo:
+                print(f"🗂️ Descartada por {motivo}: {noticia[0]} ({noticia[3]})")
+                METRICAS.incrementar("noticiasbot_candidatas_descartadas_total", motivo=motivo)
+            else:
+                admitidas.append(noticia)
+        relevancias = self.puntuar([f"{n[0]}. {n[1]}" for n in admitidas])
+
+        candidatas = []
+        for noticia, relevancia in zip(admitidas, relevancias.tolist()):
+            titulo, url = noticia[0], noticia[3]
+            ruta = urlsplit(url).path
+            puntuacion = relevancia
+            motivo = ""
+            if PATRON_TITULO_LISTADO.search(titulo):
+                puntuacion -= PENALIZACION_TITULO
+                motivo = "título de recopilatorio"
+            if PATRON_FECHA_EN_RUTA.search(ruta):
+                puntuacion += BONUS_FECHA
+            if ruta.rstrip("/").rsplit("/", 1)[-1].count("-") >= 3:
+                puntuacion += BONUS_SLUG
+            if puntuacion < self.minima:
+                print(f"🗂️ Descartada por puntuación {puntuacion:.2f}: {titulo}")
+                METRICAS.incrementar("noticiasbot_candidatas_descartadas_total", motivo="puntuacion")
+                continue
+            candidatas.append(Candidata(round(puntuacion, 4), noticia, motivo))
+        candidatas.sort(key=lambda c: c.puntuacion, reverse=True)
+        return candidatas
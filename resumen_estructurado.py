@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import json
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 🧾 Resumen y conceptos visuales en una sola llamada al LLM, pidiendo a Ollama un JSON con esquema
+DESCRIPCIONES = {
+    "titulo": "titulo: título de la noticia en español, máximo 15 palabras",
+    "resumen": "resumen: 1–2 frases claras en español",
+    "comentario": "comentario: análisis de impacto o contexto, también en español",
+    "conceptos": "conceptos: lista de 4 conceptos visuales clave para una imagen, en inglés",
+}
+
+PROPIEDADES = {
+    "titulo": {"type": "string"},
+    "resumen": {"type": "string"},
+    "comentario": {"type": "string"},
+    "conceptos": {"type": "array", "items": {"type": "string"}, "minItems": 1, "maxItems": 4},
+}
+
+MAX_REINTENTOS = 2
+
+
+@dataclass
+class NoticiaEstructurada:
+    titulo: str
+    resumen: str
+    comentario: str
+    conceptos: List[str]
+
+    def texto_resumen(self) -> str:
+        return f"{self.titulo}\n\n{self.resumen}\n\n💬 {self.comentario}"
+
+
+def esquema_para(campos: List[str]) -> dict:
+    return {
+        "type": "object",
+        "properties": {c: PROPIEDADES[c] for c in campos},
+        "required": list(campos),
+    }
+
+
+def validar_campos(datos, campos: List[str]) -> Tuple[Dict[str, object], List[str]]:
+    """
+    Comprueba los campos pedidos contra el esquema. Devuelve los válidos (ya limpios)
+    y la lista de los que faltan o no cumplen.
+    """
+    validos = {}
+    faltan = []
+    if not isinstance(datos, dict):
+        return validos, list(campos)
+    for campo in campos:
+        valor = datos.get(campo)
+        if PROPIEDADES[campo]["type"] == "string":
+            if isinstance(valor, str) and valor.strip():
+                validos[campo] = valor.strip()
+                continue
+        elif isinstance(valor, list):
+            conceptos = [c.strip() for c in valor if isinstance(c, str) and c.strip()]
+            if conceptos:
+                validos[campo] = conceptos[:PROPIEDADES[campo]["maxItems"]]
+                continue
+        faltan.append(campo)
+    return validos, faltan
+
+
+def campos_de_respuesta(respuesta: str, campos: List[str]) -> Tuple[Dict[str, object], List[str]]:
+    """
+    Decodifica la respuesta del LLM y la valida con validar_campos.
+    """
+    try:
+        datos = json.loads(respuesta)
+    except json.JSONDecodeError:
+        datos = None
+    return validar_campos(datos, campos)
+
+
+def _prompt(texto: str, campos: List[str]) -> str:
+    lineas = "\n".join(f"- {DESCRIPCIONES[c]}" for c in campos)
+    return (
+        "Analiza esta noticia y responde solo con un objeto JSON con estos campos:\n"
+        f"{lineas}\n\n"
+        f"Noticia:\n\"\"\"\n{texto}\n\"\"\""
+    )
+
+
+def extraer_noticia_estructurada(texto: str, llm: Callable[..., str]) -> Optional[NoticiaEstructurada]:
+    """
+    Pide todos los campos de una vez con `format` = esquema JSON. Si alguno falta o no es válido,
+    vuelve a pedir solo esos campos. Devuelve None si tras los reintentos sigue faltando alguno.
+    `llm(prompt, format=esquema, validar=fn)` debe devolver el texto de la respuesta; `validar`
+    dice si la respuesta es aprovechable (solo esas deben guardarse en caché).
+    """
+    campos = list(PROPIEDADES)
+    obtenidos: Dict[str, object] = {}
+    for intento in range(1 + MAX_REINTENTOS):
+        faltan = [c for c in campos if c not in obtenidos]
+        if not faltan:
+            break
+        if intento:
+            print(f"🔁 Reintentando campos del JSON: {', '.join(faltan)}")
+        respuesta = llm(
+            _prompt(texto, faltan),
+            format=esquema_para(faltan),
+            validar=lambda r, faltan=faltan: not campos_de_respuesta(r, faltan)[1],
+        )
+        validos, _ = campos_de_respuesta(respuesta, faltan)
+        obtenidos.update(validos)
+
+    if any(c not in obtenidos for c in campos):
+        print("⚠️ El LLM no devolvió un JSON válido para todos los campos")
+        return None
+    return NoticiaEstructurada(**obtenidos)
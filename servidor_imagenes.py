@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from typing import List, Optional
+
+# 🖼️ Servidor de imágenes persistente: carga SDXL una vez y atiende peticiones por socket local.
+# Protocolo: el cliente envía una línea JSON {"prompts": [...], "semillas": [...]} (opcionalmente
+# con "presupuesto_s", los segundos por imagen; si no, el SDXL_PRESUPUESTO_S del servidor); el servidor
+# responde con una línea JSON {"ok": true, "bytes": [N1, N2, ...]} seguida de las imágenes
+# concatenadas (N1 bytes, luego N2...), o {"ok": false, "error": "..."}.
+HOST = os.getenv("SERVIDOR_IMAGENES_HOST", "127.0.0.1")
+PUERTO = int(os.getenv("SERVIDOR_IMAGENES_PUERTO", "8765"))
+TIMEOUT_CONEXION = 0.5
+TIMEOUT_GENERACION = 600
+
+# Solo una generación a la vez en la GPU; el resto de peticiones esperan su turno
+_lock_gpu = threading.Lock()
+
+
+def _enviar_json(archivo, datos: dict):
+    archivo.write(json.dumps(datos, ensure_ascii=False).encode("utf-8") + b"\n")
+    archivo.flush()
+
+
+def _leer_json(archivo) -> Optional[dict]:
+    linea = archivo.readline()
+    if not linea:
+        return None
+    return json.loads(linea.decode("utf-8"))
+
+
+class _ManejadorImagenes(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            peticion = _leer_json(self.rfile)
+        except json.JSONDecodeError:
+            _enviar_json(self.wfile, {"ok": False, "error": "Petición JSON inválida"})
+            return
+        if peticion is None:
+            return
+
+        from imagen_sdxl import PRESUPUESTO_S, generar_imagenes_lote
+
+        prompts = peticion.get("prompts", [])
+        try:
+            with _lock_gpu:
+                inicio = time.time()
+                imagenes = generar_imagenes_lote(prompts, peticion.get("semillas"),
+                                                 presupuesto_s=peticion.get("presupuesto_s", PRESUPUESTO_S))
+                duracion = time.time() - inicio
+        except Exception as e:
+            print(f"❌ Error generando imagen en el servidor: {e}")
+            _enviar_json(self.wfile, {"ok": False, "error": str(e)})
+            return
+
+        print(f"🖼️ {len(imagenes)} imagen(es) servida(s) en {duracion:.2f} segundos")
+        _enviar_json(self.wfile, {"ok": True, "bytes": [len(datos) for datos in imagenes]})
+        for datos in imagenes:
+            self.wfile.write(datos)
+        self.wfile.flush()
+
+
+class _ServidorImagenes(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def _conectar() -> Optional[socket.socket]:
+    try:
+        sock = socket.create_connection((HOST, PUERTO), timeout=TIMEOUT_CONEXION)
+    except OSError:
+        return None
+    sock.settimeout(TIMEOUT_GENERACION)
+    return sock
+
+
+def servidor_en_marcha() -> bool:
+    sock = _conectar()
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def generar_imagenes_servidor(prompts: List[str], semillas: Optional[List[Optional[int]]] = None,
+                              presupuesto_s: Optional[float] = None) -> Optional[List[bytes]]:
+    """
+    Pide las imágenes al servidor persistente. Devuelve None si el servidor no está en marcha,
+    para que el llamador genere las imágenes en su propio proceso.
+    """
+    sock = _conectar()
+    if sock is None:
+        return None
+
+    with sock, sock.makefile("rwb") as archivo:
+        peticion = {"prompts": prompts, "semillas": semillas}
+        if presupuesto_s is not None:
+            peticion["presupuesto_s"] = presupuesto_s
+        _enviar_json(archivo, peticion)
+        respuesta = _leer_json(archivo)
+        if respuesta is None:
+            raise RuntimeError("El servidor de imágenes cerró la conexión sin responder")
+        if not respuesta.get("ok"):
+            raise RuntimeError(respuesta.get("error", "Error desconocido en el servidor de imágenes"))
+        imagenes = []
+        for tam in respuesta["bytes"]:
+            datos = archivo.read(tam)
+            if len(datos) != tam:
+                raise RuntimeError("Respuesta incompleta del servidor de imágenes")
+            imagenes.append(datos)
+        return imagenes
+
+
+def generar_imagen_servidor(prompt: str) -> Optional[bytes]:
+    imagenes = generar_imagenes_servidor([prompt])
+    return imagenes[0] if imagenes is not None else None
+
+
+def iniciar_servidor():
+    from imagen_sdxl import cargar_pipeline
+
+    print("⏳ Cargando pipeline de SDXL...")
+    inicio = time.time()
+    cargar_pipeline()
+    print(f"✅ Pipeline cargado en {time.time() - inicio:.2f} segundos")
+
+    with _ServidorImagenes((HOST, PUERTO), _ManejadorImagenes) as servidor:
+        print(f"🖼️ Servidor de imágenes escuchando en {HOST}:{PUERTO} (Ctrl+C para apagar)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            print("🛑 Apagando servidor de imágenes...")
+
+
+if __name__ == "__main__":
+    iniciar_servidor()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# ♻️ Detección de casi-duplicados: la misma noticia publicada por varios medios (o con otra URL)
+# tiene título y snippet casi iguales. Guardamos una firma MinHash por noticia y buscamos con LSH
+# por bandas: dos textos con similitud de Jaccard alta coinciden en alguna banda casi seguro,
+# así que cada búsqueda son BANDAS consultas a diccionarios más unas pocas comparaciones.
+ARCHIVO_HUELLAS = os.getenv("SIMILITUD_ARCHIVO", "huellas_noticias.jsonl")
+UMBRAL = float(os.getenv("SIMILITUD_UMBRAL", "0.6"))
+DIAS_RECIENTES = float(os.getenv("SIMILITUD_DIAS", "30"))
+# 24 bandas de 4 filas: con Jaccard 0.6 se encuentra el 96% de las veces, con 0.3 casi nunca
+BANDAS = 24
+FILAS = 4
+PERMUTACIONES = BANDAS * FILAS
+
+# Hash universal multiplicar-desplazar: (a·x + b) mod 2^64, quedándonos con los 32 bits altos
+_aleatorio = np.random.default_rng(20240801)
+_A = _aleatorio.integers(1, 2**63, size=PERMUTACIONES, dtype=np.uint64) | np.uint64(1)
+_B = _aleatorio.integers(0, 2**63, size=PERMUTACIONES, dtype=np.uint64)
+# Para resumir las FILAS valores de una banda en un solo entero (las colisiones se descartan al comparar)
+_MEZCLA = _aleatorio.integers(1, 2**63, size=FILAS, dtype=np.uint64)
+
+PALABRAS_VACIAS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are", "with", "by", "at",
+    "from", "as", "its", "it", "this", "that", "new", "de", "la", "el", "los", "las", "en", "y",
+    "un", "una", "con", "por", "para", "del", "al", "se", "que",
+}
+
+
+def normalizar_texto(texto: str) -> List[str]:
+    """
+    Minúsculas, sin tildes ni puntuación y sin palabras vacías.
+    """
+    texto = texto.lower()
+    if not texto.isascii():
+        texto = unicodedata.normalize("NFKD", texto)
+        texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return [p for p in re.findall(r"[a-z0-9]+", texto) if p not in PALABRAS_VACIAS]
+
+
+def firma_minhash(texto: str) -> np.ndarray:
+    palabras = set(normalizar_texto(texto)) or {""}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(p.encode("utf-8"), digest_size=8).digest(), "big") for p in palabras),
+        dtype=np.uint64, count=len(palabras))
+    with np.errstate(over="ignore"):
+        valores = (_A[:, None] * hashes[None, :] + _B[:, None]) >> np.uint64(32)
+    return valores.min(axis=1).astype(np.uint32)
+
+
+def claves_bandas(firmas: np.ndarray) -> np.ndarray:
+    """
+    Una clave por banda para cada firma: (n, PERMUTACIONES) → (n, BANDAS).
+    """
+    with np.errstate(over="ignore"):
+        return (firmas.reshape(len(firmas), BANDAS, FILAS).astype(np.uint64) * _MEZCLA).sum(axis=2)
+
+
+class IndiceSimilitud:
+    """
+    Firmas de las noticias recientes, persistidas en un JSONL de solo-añadir ({"firma", "titulo",
+    "url", "fecha"}); en memoria las firmas van en una matriz aparte. Con ruta None vive solo en memoria (p. ej. dentro de una ejecución).
+    El fichero se lee en la primera búsqueda: una ejecución sin candidatas nuevas no lo toca.
+    """
+
+    def __init__(self, ruta: Optional[str] = ARCHIVO_HUELLAS, umbral: float = UMBRAL,
+                 dias: float = DIAS_RECIENTES):
+        self.ruta = ruta
+        self.umbral = umbral
+        self.antiguedad_max = dias * 86400
+        self._bandas: List[Dict[int, List[int]]] = [{} for _ in range(BANDAS)]
+        self._entradas: List[dict] = []
+        self._firmas = np.empty((0, PERMUTACIONES), dtype=np.uint32)
+        self._lock = threading.Lock()
+        self._cargado = ruta is None
+
+    def _cargar(self):
+        self._cargado = True
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                lineas = f.readlines()
+        except FileNotFoundError:
+            return
+        limite = time.time() - self.antiguedad_max
+        entradas = []
+        for linea in lineas:
+            try:
+                entrada = json.loads(linea)
+            except json.JSONDecodeError:
+                continue
+            if entrada["fecha"] >= limite:
+                entradas.append(entrada)
+        if entradas:
+            firmas = np.frombuffer(bytes.fromhex("".join(e.pop("firma") for e in entradas)), dtype=np.uint32)
+            self._indexar(entradas, firmas.reshape(len(entradas), PERMUTACIONES))
+        # Si la mayor parte del fichero ya no cuenta, se reescribe solo con lo reciente
+        if len(lineas) - len(entradas) > len(entradas):
+            temporal = f"{self.ruta}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                for entrada, firma in zip(self._entradas, self._firmas):
+                    f.write(json.dumps({"firma": firma.tobytes().hex(), **entrada}, ensure_ascii=False) + "\n")
+            os.replace(temporal, self.ruta)
+
+    def _indexar(self, entradas: List[dict], firmas: np.ndarray):
+        inicio = len(self._entradas)
+        self._entradas.extend(entradas)
+        self._firmas = np.concatenate([self._firmas, firmas])
+        for i, claves in enumerate(claves_bandas(firmas).T.tolist()):
+            banda = self._bandas[i]
+            for posicion, clave in enumerate(claves, start=inicio):
+                banda.setdefault(clave, []).append(posicion)
+
+    def buscar(self, texto: str) -> Optional[dict]:
+        """
+        Devuelve la noticia reciente más parecida (con similitud estimada ≥ umbral) o None.
+        """
+        firma = firma_minhash(texto)
+        limite = time.time() - self.antiguedad_max
+        with self._lock:
+            if not self._cargado:
+                self._cargar()
+            candidatas = set()
+            for i, clave in enumerate(claves_bandas(firma[None, :])[0].tolist()):
+                candidatas.update(self._bandas[i].get(clave, ()))
+            candidatas = [p for p in candidatas if self._entradas[p]["fecha"] >= limite]
+            if not candidatas:
+                return None
+            similitudes = (self._firmas[candidatas] == firma).mean(axis=1)
+            mejor = int(similitudes.argmax())
+            if similitudes[mejor] < self.umbral:
+                return None
+            return {**self._entradas[candidatas[mejor]], "similitud": round(float(similitudes[mejor]), 2)}
+
+    def anadir(self, texto: str, titulo: str, url: str):
+        firma = firma_minhash(texto)
+        entrada = {"titulo": titulo, "url": url, "fecha": time.time()}
+        with self._lock:
+            if not self._cargado:
+                self._cargar()
+            self._indexar([entrada], firma[None, :])
+            if self.ruta is not None:
+                # Una línea en modo "a" se añade de una vez: no hace falta bloqueo
+                with open(self.ruta, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"firma": firma.tobytes().hex(), **entrada}, ensure_ascii=False) + "\n")
@@ -1,30 +1,32 @@
 import asyncio
 import os
 import threading
-import requests
+from typing import Optional
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.constants import ChatAction
 from telegram.ext import Application, MessageHandler, filters, ContextTypes
+from cliente_ollama import ClienteOllama
+from planificador_chat import ColaLlena, PlanificadorChat
 
 # Cargar token desde .env
 load_dotenv("credenciales_telegram.env")
 TOKEN = os.getenv("TELEGRAM_TOKEN")
 
-# Semáforo para controlar acceso concurrente al modelo
-semaforo_llm = asyncio.Semaphore(1)
-
-def responder_con_modelo_local(prompt: str) -> str:
-    url = "http://localhost:11434/v1/chat/completions"
-    payload = {
-        "model": "mistral-7b-instruct-v0.3",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7,
-    }
-    headers = {"Content-Type": "application/json"}
+# Turnos para el modelo: CHAT_HUECOS (u OLLAMA_NUM_PARALLEL) a la vez, repartidos por chat
+PLANIFICADOR = PlanificadorChat()
+# Cliente propio con tantas conexiones como huecos: quien tiene turno no espera a nadie más,
+# y el tiempo de servicio medido es solo el del modelo
+CLIENTE_CHAT = ClienteOllama(max_en_vuelo=PLANIFICADOR.huecos)
+
+MENSAJES_RECHAZO = {
+    "usuario": "🙏 Ya tengo varias preguntas tuyas en marcha. Espera a que te responda y vuelve a escribirme.",
+    "global": "🙏 Ahora mismo hay demasiadas preguntas en cola. Inténtalo de nuevo en unos minutos.",
+}
+
+async def responder_con_modelo_local(prompt: str) -> str:
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=90)
-        return response.json()["choices"][0]["message"]["content"]
+        return await CLIENTE_CHAT.chat_openai_async(prompt, "mistral-7b-instruct-v0.3", temperature=0.7)
     except Exception as e:
         return f"❌ Error al consultar el modelo: {e}"
 
@@ -43,16 +45,28 @@ async def responder(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.chat.send_action(ChatAction.TYPING)
 
         aviso = None
-        if semaforo_llm.locked():
-            aviso = await message.reply_text("⌛ Estoy generando tu respuesta, un momento...")
-
-        async with semaforo_llm:
-            loop = asyncio.get_event_loop()
-            respuesta = await loop.run_in_executor(None, responder_con_modelo_local, message.text)
-            await message.reply_text(respuesta)
 
+        async def avisar_posicion(posicion: int):
+            nonlocal aviso
+            texto = f"⌛ Estás el #{posicion} en la cola, te respondo en cuanto pueda..."
+            if aviso is None:
+                aviso = await message.reply_text(texto)
+            else:
+                await aviso.edit_text(texto)
+
+        # La respuesta se envía ya fuera del turno: subirla a Telegram no ocupa hueco del modelo
+        try:
+            async with PLANIFICADOR.turno(chat.id, avisar_posicion):
+                if aviso:
+                    await message.chat.send_action(ChatAction.TYPING)
+                respuesta = await responder_con_modelo_local(message.text)
+        except ColaLlena as e:
+            print(f"🚫 Rechazado ({e.motivo}): {PLANIFICADOR.en_cola} en cola")
+            respuesta = MENSAJES_RECHAZO[e.motivo]
+        finally:
             if aviso:
                 await aviso.delete()
+        await message.reply_text(respuesta)
     else:
         print("⚠️ Mensaje sin texto. Ignorado.")
 
@@ -81,10 +95,21 @@ def arrancar_bot(app: Application, stop_event: threading.Event):
     loop.run_until_complete(run())
     loop.close()
 
+def construir_aplicacion(token: str = TOKEN, base_url: Optional[str] = None) -> Application:
+    """
+    Sin concurrent_updates, python-telegram-bot atiende las actualizaciones de una en una y el
+    planificador nunca llega a repartir nada: los límites de cola y los turnos son suyos.
+    """
+    constructor = Application.builder().token(token).read_timeout(30).concurrent_updates(True)
+    if base_url:
+        constructor = constructor.base_url(base_url)
+    app = constructor.build()
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, responder))
+    return app
+
 def iniciar_bot():
     stop_event = threading.Event()
-    app = Application.builder().token(TOKEN).read_timeout(30).build()
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, responder))
+    app = construir_aplicacion()
 
     hilo = threading.Thread(target=arrancar_bot, args=(app, stop_event), daemon=True)
     hilo.start()